@@ -6,9 +6,22 @@
 """
 
 import os
-import sys
+import re
+import json
+import time
+import mmap
+import hashlib
+import socket
+import sqlite3
+import shutil
+import tempfile
 import threading
 import subprocess
+from array import array
+from bisect import bisect_left
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from pathlib import Path
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox, scrolledtext
@@ -16,6 +29,209 @@ from datetime import datetime
 import arabic_reshaper
 from bidi.algorithm import get_display
 
+# بخش ساده زیرنویس (زمان شروع، زمان پایان، متن) برای برش‌ها و حافظه موقت
+SubtitleSegment = namedtuple('SubtitleSegment', ['start', 'end', 'text'])
+
+# اندازه‌های مدل Whisper به ترتیب دقت (از کم به زیاد)
+WHISPER_MODELS = ["tiny", "base", "small", "medium", "large-v3"]
+
+# انواع محاسبه قابل سنجش برای هر دستگاه (اولی پیش‌فرض است)
+COMPUTE_TYPES = {
+    'cuda': ["float16", "int8_float16"],
+    'cpu': ["int8", "float32"],
+}
+
+# کد زبان فارسی در مدل ترجمه NLLB
+PERSIAN_NLLB_CODE = "pes_Arab"
+
+# کد زبان‌های Whisper به کد NLLB (زبان‌های Whisper که NLLB پشتیبانی نمی‌کند: br، haw، la)
+WHISPER_TO_NLLB = {
+    'af': 'afr_Latn', 'am': 'amh_Ethi', 'ar': 'arb_Arab', 'as': 'asm_Beng', 'az': 'azj_Latn',
+    'ba': 'bak_Cyrl', 'be': 'bel_Cyrl', 'bg': 'bul_Cyrl', 'bn': 'ben_Beng', 'bo': 'bod_Tibt',
+    'bs': 'bos_Latn', 'ca': 'cat_Latn', 'cs': 'ces_Latn', 'cy': 'cym_Latn', 'da': 'dan_Latn',
+    'de': 'deu_Latn', 'el': 'ell_Grek', 'en': 'eng_Latn', 'es': 'spa_Latn', 'et': 'est_Latn',
+    'eu': 'eus_Latn', 'fa': PERSIAN_NLLB_CODE, 'fi': 'fin_Latn', 'fo': 'fao_Latn', 'fr': 'fra_Latn',
+    'gl': 'glg_Latn', 'gu': 'guj_Gujr', 'ha': 'hau_Latn', 'he': 'heb_Hebr', 'hi': 'hin_Deva',
+    'hr': 'hrv_Latn', 'ht': 'hat_Latn', 'hu': 'hun_Latn', 'hy': 'hye_Armn', 'id': 'ind_Latn',
+    'is': 'isl_Latn', 'it': 'ita_Latn', 'ja': 'jpn_Jpan', 'jw': 'jav_Latn', 'ka': 'kat_Geor',
+    'kk': 'kaz_Cyrl', 'km': 'khm_Khmr', 'kn': 'kan_Knda', 'ko': 'kor_Hang', 'lb': 'ltz_Latn',
+    'ln': 'lin_Latn', 'lo': 'lao_Laoo', 'lt': 'lit_Latn', 'lv': 'lvs_Latn', 'mg': 'plt_Latn',
+    'mi': 'mri_Latn', 'mk': 'mkd_Cyrl', 'ml': 'mal_Mlym', 'mn': 'khk_Cyrl', 'mr': 'mar_Deva',
+    'ms': 'zsm_Latn', 'mt': 'mlt_Latn', 'my': 'mya_Mymr', 'ne': 'npi_Deva', 'nl': 'nld_Latn',
+    'nn': 'nno_Latn', 'no': 'nob_Latn', 'oc': 'oci_Latn', 'pa': 'pan_Guru', 'pl': 'pol_Latn',
+    'ps': 'pbt_Arab', 'pt': 'por_Latn', 'ro': 'ron_Latn', 'ru': 'rus_Cyrl', 'sa': 'san_Deva',
+    'sd': 'snd_Arab', 'si': 'sin_Sinh', 'sk': 'slk_Latn', 'sl': 'slv_Latn', 'sn': 'sna_Latn',
+    'so': 'som_Latn', 'sq': 'als_Latn', 'sr': 'srp_Cyrl', 'su': 'sun_Latn', 'sv': 'swe_Latn',
+    'sw': 'swh_Latn', 'ta': 'tam_Taml', 'te': 'tel_Telu', 'tg': 'tgk_Cyrl', 'th': 'tha_Thai',
+    'tk': 'tuk_Latn', 'tl': 'tgl_Latn', 'tr': 'tur_Latn', 'tt': 'tat_Cyrl', 'uk': 'ukr_Cyrl',
+    'ur': 'urd_Arab', 'uz': 'uzn_Latn', 'vi': 'vie_Latn', 'yi': 'ydd_Hebr', 'yo': 'yor_Latn',
+    'yue': 'yue_Hant', 'zh': 'zho_Hans',
+}
+
+# پیش‌تنظیم‌های استایل برای خروجی‌های اضافه (روی تنظیمات ظاهری فعلی اعمال می‌شوند)
+STYLE_PRESETS = {
+    'large': ("درشت (Large)", {'font_size': 28, 'outline_width': 3}),
+    'yellow': ("زرد (Yellow)", {'font_color': '#FFD500'}),
+    'top': ("بالای تصویر (Top)", {'position': 'top'}),
+}
+
+# پوشه حافظه موقت محلی (اثر انگشت صوتی و ...)
+CACHE_DIR = Path.home() / ".persian_subtitle_cache"
+
+
+def format_ass_timestamps(values):
+    """قالب‌بندی دسته‌ای میلی‌ثانیه‌ها به H:MM:SS.cc (با گرد کردن مشابه Aegisub/pysubs2)"""
+    result = []
+    for ms in values:
+        ms = (ms + 5) - (ms + 5) % 10
+        s, ms = divmod(ms, 1000)
+        m, s = divmod(s, 60)
+        h, m = divmod(m, 60)
+        result.append(f"{h:01d}:{m:02d}:{s:02d}.{ms // 10:02d}")
+    return result
+
+
+def format_srt_timestamps(values):
+    """قالب‌بندی دسته‌ای میلی‌ثانیه‌ها به HH:MM:SS,mmm"""
+    result = []
+    for ms in values:
+        s, ms = divmod(ms, 1000)
+        m, s = divmod(s, 60)
+        h, m = divmod(m, 60)
+        result.append(f"{h:02d}:{m:02d}:{s:02d},{ms:03d}")
+    return result
+
+
+def plain_subtitle_text(text):
+    """تبدیل متن ASS به متن ساده SRT/WebVTT (حذف فاصله‌های اضافی)"""
+    if '{' in text:
+        # تگ‌های override در خروجی Whisper نادرند؛ تبدیل آن‌ها (مثلاً {\i1} به <i>) به خود pysubs2 سپرده می‌شود
+        import pysubs2
+        subs = pysubs2.SSAFile()
+        subs.append(pysubs2.SSAEvent(start=0, end=0, text=text))
+        parts = subs.to_string("srt").split("\n", 2)
+        return parts[2][:-2] if len(parts) == 3 else ""
+    text = text.replace(r"\h", " ").replace(r"\n", "\n").replace(r"\N", "\n")
+    return re.sub("\n+", "\n", text.strip())
+
+
+class SegmentStore:
+    """نگهداری ستونی و فشرده بخش‌های زیرنویس
+    
+    زمان‌های شروع و پایان در آرایه‌های float64 و متن‌ها در یک مخزن UTF-8
+    واحد نگهداری می‌شوند. قالب باینری مستقیماً از روی فایل memory-map
+    خوانده می‌شود تا مراحل ترجمه، اصلاح متن، ساخت ASS و پردازه‌های کارگر
+    بدون کپی از یک نسخه مشترک استفاده کنند.
+    
+    قالب فایل: MAGIC | تعداد (u64) | طول مخزن (u64) | starts | ends | offsets | pool
+    """
+    
+    MAGIC = b'PSEG0001'
+    HEADER_SIZE = 24
+    
+    def __init__(self, starts, ends, offsets, pool, buffer=None):
+        self.starts = starts    # زمان شروع (ثانیه)
+        self.ends = ends        # زمان پایان (ثانیه)
+        self.offsets = offsets  # محل شروع هر متن در مخزن (n+1 عدد)
+        self.pool = pool        # متن‌های UTF-8 پشت سر هم
+        self._buffer = buffer   # mmap زیرین (در صورت بارگذاری از فایل)
+    
+    @classmethod
+    def from_segments(cls, segments):
+        """ساخت از هر دنباله‌ای از اشیای دارای start/end/text (مثلاً خروجی Whisper)"""
+        starts, ends, offsets, pool = array('d'), array('d'), array('q', [0]), bytearray()
+        for segment in segments:
+            starts.append(segment.start)
+            ends.append(segment.end)
+            pool += segment.text.encode('utf-8')
+            offsets.append(len(pool))
+        return cls(starts, ends, offsets, bytes(pool))
+    
+    @classmethod
+    def from_bytes(cls, data, buffer=None):
+        """خواندن قالب باینری بدون کپی (روی bytes یا mmap)"""
+        view = memoryview(data)
+        if bytes(view[:8]) != cls.MAGIC:
+            raise ValueError("قالب فایل بخش‌های زیرنویس نامعتبر است")
+        count, pool_size = view[8:cls.HEADER_SIZE].cast('Q')
+        
+        position = cls.HEADER_SIZE
+        starts = view[position:position + count * 8].cast('d')
+        position += count * 8
+        ends = view[position:position + count * 8].cast('d')
+        position += count * 8
+        offsets = view[position:position + (count + 1) * 8].cast('q')
+        position += (count + 1) * 8
+        pool = view[position:position + pool_size]
+        return cls(starts, ends, offsets, pool, buffer)
+    
+    @classmethod
+    def load(cls, path):
+        """بارگذاری memory-mapped از فایل (فقط خواندنی و قابل اشتراک بین پردازه‌ها)"""
+        with open(path, 'rb') as f:
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return cls.from_bytes(buffer, buffer)
+    
+    def to_bytes(self):
+        """تبدیل به قالب باینری"""
+        header = self.MAGIC + array('Q', [len(self), len(self.pool)]).tobytes()
+        return b''.join([
+            header,
+            bytes(self.starts),
+            bytes(self.ends),
+            bytes(self.offsets),
+            bytes(self.pool)
+        ])
+    
+    def save(self, path):
+        """ذخیره در فایل برای memory-map شدن در مراحل/پردازه‌های دیگر"""
+        with open(path, 'wb') as f:
+            f.write(self.to_bytes())
+        return path
+    
+    def close(self):
+        """آزاد کردن mmap زیرین (نسخه‌های ساخته شده با with_texts هم دیگر معتبر نیستند)"""
+        if self._buffer is not None:
+            for view in (self.starts, self.ends, self.offsets, self.pool):
+                view.release()
+            self.starts = self.ends = self.offsets = self.pool = None
+            self._buffer.close()
+            self._buffer = None
+    
+    def __len__(self):
+        return len(self.starts)
+    
+    def text(self, index):
+        """متن یک بخش (فقط همین بخش از مخزن دیکود می‌شود)"""
+        return bytes(self.pool[self.offsets[index]:self.offsets[index + 1]]).decode('utf-8')
+    
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        return SubtitleSegment(self.starts[index], self.ends[index], self.text(index))
+    
+    def __iter__(self):
+        for index in range(len(self)):
+            yield SubtitleSegment(self.starts[index], self.ends[index], self.text(index))
+    
+    def shifted(self, offset):
+        """نسخه جدید با زمان‌های جابه‌جا شده (ثانیه، بدون مقدار منفی) و همان مخزن متن"""
+        starts = array('d', (max(value + offset, 0.0) for value in self.starts))
+        ends = array('d', (max(value + offset, 0.0) for value in self.ends))
+        return SegmentStore(starts, ends, self.offsets, self.pool)
+    
+    def with_texts(self, texts):
+        """نسخه جدید با متن‌های جایگزین (مثلاً ترجمه) و همان آرایه‌های زمانی"""
+        offsets, pool = array('q', [0]), bytearray()
+        for text in texts:
+            pool += text.encode('utf-8')
+            offsets.append(len(pool))
+        if len(offsets) != len(self) + 1:
+            raise ValueError("تعداد متن‌ها با تعداد بخش‌ها برابر نیست")
+        return SegmentStore(self.starts, self.ends, offsets, bytes(pool))
+
 # بررسی و نصب کتابخانه‌های مورد نیاز
 def check_and_install_requirements():
     """بررسی و راهنمای نصب کتابخانه‌های مورد نیاز"""
@@ -38,6 +254,277 @@ def check_and_install_requirements():
     
     return missing
 
+class MetricsRegistry:
+    """متریک‌های داخلی برنامه (شمارنده، گیج و هیستوگرام) با خروجی متنی Prometheus
+    
+    ثبت هر مقدار فقط یک جستجوی دیکشنری و یک bisect زیر قفل است تا روی مسیرهای
+    پرتکرار هزینه محسوسی نداشته باشد. خروجی در فایل (textfile collector) یا
+    از طریق یک HTTP endpoint محلی (/metrics) در دسترس است.
+    """
+    
+    PREFIX = "persian_subtitle_"
+    DEFAULT_BUCKETS = (0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800, 3600, 7200)
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics = {}
+        self.describe("process_start_time_seconds", "gauge", "Start time of the process since unix epoch")
+        self.set_gauge("process_start_time_seconds", time.time())
+    
+    def describe(self, name, kind, help_text, buckets=None):
+        """تعریف یک متریک (counter / gauge / histogram)"""
+        with self._lock:
+            self._metrics.setdefault(name, {
+                'type': kind,
+                'help': help_text,
+                'buckets': tuple(buckets or self.DEFAULT_BUCKETS),
+                'series': {}
+            })
+    
+    def _series(self, name, kind, labels):
+        metric = self._metrics.get(name)
+        if metric is None:
+            metric = self._metrics[name] = {
+                'type': kind, 'help': name, 'buckets': self.DEFAULT_BUCKETS, 'series': {}
+            }
+        return metric, tuple(sorted(labels.items()))
+    
+    def inc(self, name, value=1, **labels):
+        with self._lock:
+            metric, key = self._series(name, "counter", labels)
+            metric['series'][key] = metric['series'].get(key, 0) + value
+    
+    def set_gauge(self, name, value, **labels):
+        with self._lock:
+            metric, key = self._series(name, "gauge", labels)
+            metric['series'][key] = value
+    
+    def observe(self, name, value, **labels):
+        with self._lock:
+            metric, key = self._series(name, "histogram", labels)
+            series = metric['series'].get(key)
+            if series is None:
+                # [تعداد هر باکت (غیرتجمعی)، جمع، تعداد]
+                series = metric['series'][key] = [[0] * (len(metric['buckets']) + 1), 0.0, 0]
+            series[0][bisect_left(metric['buckets'], value)] += 1
+            series[1] += value
+            series[2] += 1
+    
+    @staticmethod
+    def _format_labels(labels, extra=None):
+        items = list(labels) + ([extra] if extra else [])
+        if not items:
+            return ""
+        escaped = (
+            f'{k}="{str(v).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34)).replace(chr(10), chr(92) + "n")}"'
+            for k, v in items
+        )
+        return "{" + ",".join(escaped) + "}"
+    
+    def render(self):
+        """خروجی با قالب متنی Prometheus (نسخه 0.0.4)"""
+        with self._lock:
+            snapshot = {
+                name: dict(metric, series={
+                    key: ([list(value[0]), value[1], value[2]] if metric['type'] == "histogram" else value)
+                    for key, value in metric['series'].items()
+                })
+                for name, metric in self._metrics.items()
+            }
+        
+        lines = []
+        for name, metric in sorted(snapshot.items()):
+            full_name = self.PREFIX + name
+            lines.append(f"# HELP {full_name} {metric['help']}")
+            lines.append(f"# TYPE {full_name} {metric['type']}")
+            for key, value in sorted(metric['series'].items()):
+                if metric['type'] != "histogram":
+                    lines.append(f"{full_name}{self._format_labels(key)} {value}")
+                    continue
+                counts, total, count = value
+                cumulative = 0
+                for bound, bucket_count in zip(metric['buckets'] + ("+Inf",), counts):
+                    cumulative += bucket_count
+                    lines.append(f"{full_name}_bucket{self._format_labels(key, ('le', bound))} {cumulative}")
+                lines.append(f"{full_name}_sum{self._format_labels(key)} {total}")
+                lines.append(f"{full_name}_count{self._format_labels(key)} {count}")
+        return "\n".join(lines) + "\n"
+    
+    def write_textfile(self, path):
+        """نوشتن اتمی در فایل (سازگار با textfile collector در node_exporter)"""
+        temp_path = f"{path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            f.write(self.render())
+        os.replace(temp_path, path)
+    
+    def serve(self, port, host="127.0.0.1"):
+        """راه‌اندازی HTTP endpoint محلی /metrics در یک ترد پس‌زمینه"""
+        registry = self
+        
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = registry.render().encode('utf-8')
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            
+            def log_message(self, format, *args):
+                pass
+        
+        server = ThreadingHTTPServer((host, port), MetricsHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+
+
+# متریک‌های سراسری برنامه
+METRICS = MetricsRegistry()
+METRICS.describe("files_processed_total", "counter", "Processed video files by final status")
+METRICS.describe("failures_total", "counter", "Failed files by pipeline stage and underlying error type")
+METRICS.describe("stage_duration_seconds", "histogram", "Wall time of each pipeline stage")
+METRICS.describe("model_loads_total", "counter", "Model loads (Whisper / translation)")
+METRICS.describe("model_load_duration_seconds", "histogram", "Time spent loading models")
+METRICS.describe("ffmpeg_realtime_factor", "histogram", "Hardsub speed as media seconds per wall second",
+                 buckets=(0.25, 0.5, 1, 2, 4, 8, 16, 32, 64))
+METRICS.describe("cache_hits_total", "counter", "Reused results from the local cache by kind")
+METRICS.describe("queue_remaining_files", "gauge", "Files left in the current processing queue")
+
+# خروجی متریک‌ها (اختیاری): فایل متنی و/یا پورت HTTP محلی
+METRICS_FILE = os.environ.get("PERSIAN_SUBTITLE_METRICS_FILE")
+METRICS_PORT = os.environ.get("PERSIAN_SUBTITLE_METRICS_PORT")
+
+
+class ModelStore:
+    """مخزن محلی مدل‌ها برای سیستم‌های بدون اینترنت
+    
+    هر مدل در یک زیرپوشه نگهداری می‌شود و checksum (SHA-256) تمام فایل‌های آن
+    در manifest.json ثبت می‌شود. مخزن را می‌توان روی سیستم متصل به اینترنت
+    پر کرد و پوشه آن را روی سیستم دیگر وارد (import) کرد.
+    """
+    
+    MANIFEST = "manifest.json"
+    TRANSLATION_MODEL = "facebook/nllb-200-distilled-600M"
+    
+    def __init__(self, root):
+        self.root = Path(root)
+    
+    @staticmethod
+    def whisper_name(model_size):
+        return f"whisper-{model_size}"
+    
+    @staticmethod
+    def translator_name():
+        return ModelStore.TRANSLATION_MODEL.split('/')[-1]
+    
+    def model_dir(self, name):
+        return self.root / name
+    
+    def load_manifest(self, root=None):
+        path = Path(root or self.root) / self.MANIFEST
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+    
+    def save_manifest(self, manifest):
+        self.root.mkdir(parents=True, exist_ok=True)
+        with open(self.root / self.MANIFEST, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
+    
+    @staticmethod
+    def checksum_dir(path):
+        """SHA-256 تمام فایل‌های یک پوشه مدل (پوشه‌های مخفی مانند .cache نادیده گرفته می‌شوند)"""
+        checksums = {}
+        for root_dir, dirs, files in os.walk(path):
+            dirs[:] = sorted(d for d in dirs if not d.startswith('.'))
+            for file in sorted(files):
+                file_path = os.path.join(root_dir, file)
+                digest = hashlib.sha256()
+                with open(file_path, 'rb') as f:
+                    for block in iter(lambda: f.read(1 << 20), b''):
+                        digest.update(block)
+                checksums[os.path.relpath(file_path, path).replace(os.sep, '/')] = digest.hexdigest()
+        return checksums
+    
+    def has(self, name):
+        return name in self.load_manifest() and self.model_dir(name).is_dir()
+    
+    def register(self, name):
+        """ثبت checksum مدلی که در پوشه مخزن قرار گرفته"""
+        manifest = self.load_manifest()
+        manifest[name] = self.checksum_dir(self.model_dir(name))
+        self.save_manifest(manifest)
+    
+    def verify(self, name):
+        """مقایسه فایل‌های مدل با checksum ثبت شده"""
+        expected = self.load_manifest().get(name)
+        return bool(expected) and self.checksum_dir(self.model_dir(name)) == expected
+    
+    def fetch_whisper(self, model_size):
+        """دریافت مدل Whisper در مخزن (نیازمند اینترنت)"""
+        from faster_whisper import download_model
+        download_model(model_size, output_dir=str(self.model_dir(self.whisper_name(model_size))))
+        self.register(self.whisper_name(model_size))
+    
+    def fetch_translator(self):
+        """دریافت مدل ترجمه NLLB در مخزن (نیازمند اینترنت)"""
+        from huggingface_hub import snapshot_download
+        snapshot_download(self.TRANSLATION_MODEL, local_dir=str(self.model_dir(self.translator_name())))
+        self.register(self.translator_name())
+    
+    def import_store(self, source_root):
+        """وارد کردن مدل‌ها از مخزن دیگر (مثلاً حافظه USB) با بررسی checksum"""
+        source_manifest = self.load_manifest(source_root)
+        if not source_manifest:
+            raise Exception("manifest.json در پوشه مبدا یافت نشد")
+        
+        imported, failed = [], []
+        manifest = self.load_manifest()
+        self.root.mkdir(parents=True, exist_ok=True)
+        for name, expected in source_manifest.items():
+            source = Path(source_root) / str(name)
+            if not self.is_valid_name(name) or not isinstance(expected, dict) or not source.is_dir():
+                failed.append(str(name))
+                continue
+            
+            # کپی در پوشه موقت داخل مخزن؛ مدل فعلی فقط پس از تایید checksum جایگزین می‌شود
+            staging = Path(tempfile.mkdtemp(prefix=".import_", dir=self.root))
+            try:
+                copy = staging / name
+                shutil.copytree(source, copy)
+                if self.checksum_dir(copy) != expected:
+                    failed.append(name)
+                    continue
+                
+                target = self.model_dir(name)
+                if target.exists():
+                    os.replace(target, staging / ".previous")
+                os.replace(copy, target)
+                manifest[name] = expected
+                imported.append(name)
+            finally:
+                shutil.rmtree(staging, ignore_errors=True)
+        
+        self.save_manifest(manifest)
+        return imported, failed
+    
+    @staticmethod
+    def is_valid_name(name):
+        """نام مدل باید یک جزء ساده مسیر باشد (مثلاً "../.." از مخزن خارج می‌شود)"""
+        return (
+            isinstance(name, str)
+            and name not in ("", ".", "..")
+            and not name.startswith(".")
+            and not any(char in name for char in '/\\:')
+            and Path(name).name == name
+        )
+
+
 class PersianSubtitleApp:
     """کلاس اصلی برنامه زیرنویس‌ساز فارسی"""
     
@@ -60,10 +547,35 @@ class PersianSubtitleApp:
         self.outline_width = tk.IntVar(value=2)
         self.subtitle_position = tk.StringVar(value="bottom")
         self.model_size = tk.StringVar(value="medium")
+        self.target_minutes = tk.IntVar(value=60)
+        self.parallel_segments = tk.IntVar(value=1)
+        self.use_fingerprint_cache = tk.BooleanVar(value=True)
+        self.output_original = tk.BooleanVar(value=False)
+        self.style_preset_vars = {preset: tk.BooleanVar(value=False) for preset in STYLE_PRESETS}
         self.processing = False
+        self.hardsub_speed = {}  # ضریب بلادرنگ آخرین هاردساب به تفکیک حالت
+        self.remaining_files = 1  # تعداد فایل‌های باقی‌مانده صف (برای انتخاب خودکار مدل)
+        self._whisper_model = None  # (کلید، مدل) آخرین مدل بارگذاری شده
+        self._model_choice = None  # ((فایل صوتی، مدل درخواستی)، (مدل، دستگاه، نوع محاسبه)) آخرین انتخاب مدل
+        self._translator = None  # pipeline ترجمه (یک بار بارگذاری می‌شود)
+        self._model_lock = threading.RLock()  # هماهنگی بارگذاری مدل بین warm-up و پردازش
+        self._speed_lock = threading.Lock()  # نوشتن هم‌زمان پروفایل سرعت (خروجی‌های هم‌زمان)
+        self._baseline_lock = threading.Lock()  # فقط یک سنجش مبنای هاردساب در هر زمان
+        self._benchmark_failures = set()  # سنجش‌های ناموفق این اجرا (ذخیره نمی‌شوند)
+        self._verified_models = set()  # (پوشه مخزن، نام مدل)هایی که checksum آن‌ها در این اجرا بررسی شده
+        self._stage = None  # مرحله جاری پردازش (برای متریک‌ها)
+        self._stage_started = 0.0
+        self.model_store_dir = tk.StringVar(value=str(CACHE_DIR / "models"))
+        self.offline_models = tk.BooleanVar(value=False)
+        self.real_preview = tk.BooleanVar(value=True)
+        self.preview_time = tk.DoubleVar(value=10.0)
+        self.preview_image = None  # نگه‌داشتن ارجاع PhotoImage (جلوگیری از پاک شدن توسط GC)
         
         self.create_widgets()
         self.check_dependencies()
+        
+        # آماده‌سازی مدل‌های مخزن محلی در پس‌زمینه تا اولین پردازش منتظر بارگذاری نماند
+        self.root.after(500, lambda: threading.Thread(target=self.warm_up_models, daemon=True).start())
     
     def create_widgets(self):
         """ایجاد رابط گرافیکی"""
@@ -339,11 +851,30 @@ class PersianSubtitleApp:
         )
         self.preview_label.pack(pady=20)
         
+        preview_options = ttk.Frame(preview_frame)
+        preview_options.pack()
+        
+        ttk.Checkbutton(
+            preview_options,
+            text="رندر واقعی روی فریم ویدیو (libass)",
+            variable=self.real_preview
+        ).pack(side=tk.LEFT, padx=5)
+        
+        ttk.Label(preview_options, text="زمان فریم (ثانیه):").pack(side=tk.LEFT, padx=5)
+        ttk.Spinbox(
+            preview_options,
+            from_=0,
+            to=36000,
+            increment=5,
+            textvariable=self.preview_time,
+            width=8
+        ).pack(side=tk.LEFT, padx=5)
+        
         ttk.Button(
             preview_frame,
             text="🔄 بروزرسانی پیش‌نمایش",
             command=self.update_preview
-        ).pack()
+        ).pack(pady=5)
     
     def create_advanced_tab(self, parent):
         """تب تنظیمات پیشرفته"""
@@ -360,12 +891,12 @@ class PersianSubtitleApp:
         • small: متوسط در سرعت و دقت (~2GB RAM)
         • medium: دقت خوب، سرعت متوسط (~5GB RAM) - پیشنهادی
         • large-v3: بالاترین دقت، کندترین (~10GB RAM)
+        • auto: دقیق‌ترین مدلی که با سرعت سنجیده شده روی این سیستم به مهلت زیر برسد
         """
         
         ttk.Label(model_frame, text=model_info, justify=tk.LEFT).pack(anchor=tk.W, pady=5)
         
-        models = ["tiny", "base", "small", "medium", "large-v3"]
-        for model in models:
+        for model in WHISPER_MODELS + ["auto"]:
             ttk.Radiobutton(
                 model_frame,
                 text=model,
@@ -373,6 +904,50 @@ class PersianSubtitleApp:
                 value=model
             ).pack(anchor=tk.W, padx=20)
         
+        deadline_frame = ttk.Frame(model_frame)
+        deadline_frame.pack(anchor=tk.W, padx=20, pady=5)
+        ttk.Label(deadline_frame, text="مهلت پردازش صف در حالت auto (دقیقه):").pack(side=tk.LEFT)
+        ttk.Spinbox(
+            deadline_frame,
+            from_=1,
+            to=1440,
+            textvariable=self.target_minutes,
+            width=10
+        ).pack(side=tk.LEFT, padx=5)
+
+        # مخزن محلی مدل‌ها (اجرای بدون اینترنت)
+        store_frame = ttk.LabelFrame(parent, text="📦 مخزن محلی مدل‌ها", padding="10")
+        store_frame.pack(fill=tk.X, pady=5)
+
+        ttk.Label(store_frame, text="پوشه مخزن:").grid(row=0, column=0, sticky=tk.W, padx=5, pady=5)
+        ttk.Entry(store_frame, textvariable=self.model_store_dir, width=50).grid(row=0, column=1, sticky=(tk.W, tk.E), padx=5, pady=5)
+        ttk.Button(
+            store_frame,
+            text="انتخاب",
+            command=self.select_model_store_dir
+        ).grid(row=0, column=2, padx=5, pady=5)
+
+        ttk.Checkbutton(
+            store_frame,
+            text="حالت آفلاین (فقط مدل‌های مخزن محلی، بدون دانلود)",
+            variable=self.offline_models
+        ).grid(row=1, column=0, columnspan=3, sticky=tk.W, padx=5, pady=5)
+
+        store_buttons = ttk.Frame(store_frame)
+        store_buttons.grid(row=2, column=0, columnspan=3, sticky=tk.W)
+        ttk.Button(
+            store_buttons,
+            text="⬇️ دریافت مدل‌ها در مخزن",
+            command=self.fetch_models
+        ).pack(side=tk.LEFT, padx=5)
+        ttk.Button(
+            store_buttons,
+            text="📥 وارد کردن از پوشه/USB",
+            command=self.import_models
+        ).pack(side=tk.LEFT, padx=5)
+
+        store_frame.columnconfigure(1, weight=1)
+
         # سخت‌افزار
         hardware_frame = ttk.LabelFrame(parent, text="⚡ تنظیمات سخت‌افزاری", padding="10")
         hardware_frame.pack(fill=tk.X, pady=5)
@@ -385,7 +960,38 @@ class PersianSubtitleApp:
         """
         
         ttk.Label(hardware_frame, text=hardware_info, justify=tk.LEFT).pack(anchor=tk.W)
-    
+
+        # انکود موازی
+        parallel_frame = ttk.LabelFrame(parent, text="🚀 هاردساب موازی (ویدیوهای طولانی)", padding="10")
+        parallel_frame.pack(fill=tk.X, pady=5)
+
+        ttk.Label(parallel_frame, text="تعداد بخش‌های موازی (1 = غیرفعال):").grid(row=0, column=0, sticky=tk.W, padx=5, pady=5)
+        ttk.Spinbox(
+            parallel_frame,
+            from_=1,
+            to=16,
+            textvariable=self.parallel_segments,
+            width=10
+        ).grid(row=0, column=1, sticky=tk.W, padx=5, pady=5)
+
+        # خروجی‌های اضافه از یک بار تشخیص گفتار
+        outputs_frame = ttk.LabelFrame(parent, text="🗂️ خروجی‌های اضافه (از یک بار تشخیص گفتار)", padding="10")
+        outputs_frame.pack(fill=tk.X, pady=5)
+
+        ttk.Checkbutton(
+            outputs_frame,
+            text="زیرنویس به زبان اصلی ویدیو",
+            variable=self.output_original
+        ).grid(row=0, column=0, columnspan=len(STYLE_PRESETS), sticky=tk.W, padx=5, pady=5)
+
+        ttk.Label(outputs_frame, text="نسخه‌های فارسی با استایل دیگر:").grid(row=1, column=0, columnspan=len(STYLE_PRESETS), sticky=tk.W, padx=5)
+        for i, (preset, (label, _)) in enumerate(STYLE_PRESETS.items()):
+            ttk.Checkbutton(
+                outputs_frame,
+                text=label,
+                variable=self.style_preset_vars[preset]
+            ).grid(row=2, column=i, sticky=tk.W, padx=5, pady=5)
+
     def select_video(self):
         """انتخاب فایل ویدیو"""
         filename = filedialog.askopenfilename(
@@ -416,8 +1022,20 @@ class PersianSubtitleApp:
     
     def update_preview(self):
         """بروزرسانی پیش‌نمایش زیرنویس"""
+        if self.real_preview.get():
+            # رندر در پس‌زمینه تا رابط کاربری قفل نشود
+            threading.Thread(
+                target=self.render_preview,
+                args=(self.video_path.get(), self.preview_time.get(), self.current_style()),
+                daemon=True
+            ).start()
+            return
+        
         try:
+            self.preview_image = None
             self.preview_label.config(
+                image='',
+                text="این یک نمونه زیرنویس است",
                 font=(self.font_name.get(), self.font_size.get()),
                 fg=self.font_color.get()
             )
@@ -425,6 +1043,92 @@ class PersianSubtitleApp:
         except Exception as e:
             self.log(f"❌ خطا در بروزرسانی پیش‌نمایش: {str(e)}")
     
+    def render_preview(self, video_file, timestamp, style):
+        """رندر استایل فعلی با همان مسیر ASS/libass هاردساب روی یک فریم کش شده"""
+        try:
+            started = time.monotonic()
+            preview_dir = CACHE_DIR / "previews"
+            preview_dir.mkdir(parents=True, exist_ok=True)
+            
+            frame_file = self.extract_preview_frame(video_file, timestamp, preview_dir)
+            
+            # زیرنویس نمونه با همان هدر، اصلاح متن فارسی و نوشتن رویداد مسیر اصلی
+            sample = SegmentStore.from_segments([SubtitleSegment(0.0, 10.0, "این یک نمونه زیرنویس است")])
+            handle, subtitle_file = tempfile.mkstemp(suffix=".ass", dir=str(preview_dir))
+            os.close(handle)
+            output_file = subtitle_file[:-4] + ".png"
+            self.write_subtitle_files(sample, self.build_ass_header(style), subtitle_file, {})
+            
+            cmd = ['ffmpeg', '-v', 'error']
+            if frame_file:
+                cmd += ['-i', frame_file]
+            else:
+                # بدون ویدیو: پس‌زمینه تیره با ابعاد رایج
+                cmd += ['-f', 'lavfi', '-i', 'color=c=0x1a1a1a:s=1280x720']
+            cmd += [
+                '-vf', f"ass='{self.ffmpeg_subtitle_path(subtitle_file)}',scale=640:-2",
+                '-frames:v', '1',
+                '-y',
+                output_file
+            ]
+            result = subprocess.run(
+                cmd,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                universal_newlines=True,
+                encoding='utf-8',
+                startupinfo=self.get_startupinfo()
+            )
+            os.remove(subtitle_file)
+            if result.returncode != 0:
+                raise Exception(result.stderr.strip() or "FFmpeg با کد خطا بسته شد")
+            
+            elapsed = time.monotonic() - started
+            self.root.after(0, lambda: self.show_preview_image(output_file, elapsed))
+            
+        except Exception as e:
+            self.log(f"❌ خطا در بروزرسانی پیش‌نمایش: {str(e)}")
+    
+    def extract_preview_frame(self, video_file, timestamp, preview_dir):
+        """استخراج یک فریم از ویدیو (یک بار برای هر ویدیو و زمان)"""
+        if not video_file or not os.path.exists(video_file):
+            return None
+        
+        stat = os.stat(video_file)
+        key = f"{os.path.abspath(video_file)}|{stat.st_size}|{stat.st_mtime_ns}|{timestamp:.3f}"
+        frame_file = str(preview_dir / f"frame_{hashlib.sha1(key.encode('utf-8')).hexdigest()}.png")
+        if os.path.exists(frame_file):
+            return frame_file
+        
+        cmd = [
+            'ffmpeg', '-v', 'error',
+            '-ss', f"{timestamp:.3f}",
+            '-i', video_file,
+            '-frames:v', '1',
+            '-y',
+            frame_file
+        ]
+        subprocess.run(
+            cmd,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            startupinfo=self.get_startupinfo()
+        )
+        # زمان بیشتر از طول ویدیو: فریمی تولید نمی‌شود
+        return frame_file if os.path.exists(frame_file) else None
+    
+    def show_preview_image(self, image_file, elapsed):
+        """نمایش تصویر رندر شده در برچسب پیش‌نمایش (در ترد اصلی)"""
+        try:
+            self.preview_image = tk.PhotoImage(file=image_file)
+            self.preview_label.config(image=self.preview_image, text='')
+            self.log(f"🔄 پیش‌نمایش بروز شد ({elapsed:.2f}s)")
+        except Exception as e:
+            self.log(f"❌ خطا در بروزرسانی پیش‌نمایش: {str(e)}")
+        finally:
+            if os.path.exists(image_file):
+                os.remove(image_file)
+    
     def check_dependencies(self):
         """بررسی وابستگی‌ها"""
         self.log("🔍 در حال بررسی وابستگی‌ها...")
@@ -533,6 +1237,8 @@ class PersianSubtitleApp:
             self.log(f"🎬 پردازش فایل {index + 1} از {total_files}")
             self.log(f"📂 فایل جاری: {os.path.basename(video_file)}")
             self.log("*"*60 + "\n")
+            self.remaining_files = total_files - index
+            METRICS.set_gauge("queue_remaining_files", self.remaining_files)
             
             try:
                 # فراخوانی تابع اصلی پردازش برای هر فایل
@@ -542,6 +1248,12 @@ class PersianSubtitleApp:
                 self.log(f"❌ خطا در پردازش فایل {os.path.basename(video_file)}: {e}")
                 self.log("⚠️ ادامه پردازش فایل بعدی...")
                 continue
+            
+            finally:
+                self.export_metrics()
+        
+        METRICS.set_gauge("queue_remaining_files", 0)
+        self.export_metrics()
         
         # پایان کار
         self.process_btn.config(state=tk.NORMAL)
@@ -560,6 +1272,9 @@ class PersianSubtitleApp:
     
     def process_video(self, input_file=None):
         """پردازش اصلی ویدیو"""
+        status = "stopped"
+        shared_segments = None  # متن مشترک memory-mapped بین مراحل بعد از تشخیص گفتار
+        handoff_file = None
         try:
             video_file = input_file if input_file else self.video_path.get()
             
@@ -569,37 +1284,148 @@ class PersianSubtitleApp:
             video_name = Path(video_file).stem
             
             # مرحله 1: استخراج صدا
+            self.mark_stage("extract")
             self.log("\n📀 مرحله 1: استخراج صدا از ویدیو...")
             audio_file = self.extract_audio(video_file)
             
             if not self.processing:
                 return
             
-            # مرحله 2: تشخیص گفتار
-            self.log("\n🎤 مرحله 2: تشخیص گفتار با Whisper...")
-            segments = self.transcribe_audio(audio_file)
+            # بررسی اثر انگشت صوتی برای فایل‌های تکراری (پیش از تشخیص زبان تا مدل Whisper بی‌دلیل بارگذاری نشود)
+            fingerprint = None
+            cache_id = None
+            segments = None
+            cached_language = None
+            cache_offset = 0.0  # اختلاف زمانی صدای فعلی با صدای ذخیره شده (ثانیه)
+            if self.use_fingerprint_cache.get():
+                self.mark_stage("fingerprint")
+                fingerprint = self.compute_audio_fingerprint(audio_file)
+                if fingerprint is not None:
+                    match = self.find_duplicate_audio(*fingerprint)
+                    if match is not None:
+                        cache_id, segments, cached_language, cache_offset = match
+            
+            # تشخیص سریع زبان روی ابتدای صدا (فقط در حالت خودکار)
+            source_lang = self.video_language.get()
+            if source_lang == 'auto':
+                if cached_language:
+                    source_lang = cached_language
+                    self.log(f"🌐 زبان (از فایل تکراری): {source_lang}")
+                else:
+                    self.mark_stage("language_detection")
+                    source_lang = self.detect_language(video_file, audio_file) or 'auto'
+                if self.needs_translation(PERSIAN_NLLB_CODE, source_lang):
+                    self.log(f"🧭 مسیر: تشخیص گفتار + ترجمه ({self.get_nllb_lang_code(source_lang)})")
+                else:
+                    self.log("🧭 مسیر: فقط تشخیص گفتار")
             
             if not self.processing:
                 return
             
-            # مرحله 3: ترجمه (در صورت نیاز)
-            if self.video_language.get() not in ['fa', 'auto']:
-                self.log("\n🌐 مرحله 3: ترجمه به فارسی...")
-                segments = self.translate_segments(segments)
+            if segments is not None:
+                self.log("♻️ صدای این فایل قبلاً پردازش شده؛ مرحله 2 رد شد")
+                METRICS.inc("cache_hits_total", kind="transcript")
+            else:
+                # مرحله 2: تشخیص گفتار
+                self.mark_stage("transcribe")
+                self.log("\n🎤 مرحله 2: تشخیص گفتار با Whisper...")
+                segments = self.transcribe_audio(audio_file, language=source_lang)
+                
+                if not self.processing:
+                    return
+                
+                if fingerprint is not None:
+                    cache_id = self.store_audio_fingerprint(
+                        video_file, *fingerprint, segments,
+                        language=None if source_lang == 'auto' else source_lang
+                    )
             
-            if not self.processing:
-                return
+            # تحویل متن به مراحل ترجمه، ساخت زیرنویس و هاردساب (و تردهای هم‌زمان آن) از یک فایل mmap
+            handoff_file = os.path.join(tempfile.gettempdir(), f"{video_name}_{os.getpid()}.pseg")
+            shared_segments = segments = SegmentStore.load(segments.save(handoff_file))
+            
+            # مرحله 3: ترجمه (در صورت نیاز، یک بار برای هر زبان مقصد)
+            targets = self.build_output_targets(source_lang)
+            translations = {None: segments}
+            for target in targets:
+                language = target['language']
+                if language in translations:
+                    continue
+                if not self.needs_translation(language, source_lang):
+                    translations[language] = segments
+                    continue
+                
+                cached = self.load_cached_translation(cache_id, language)
+                if cached is not None and cache_offset:
+                    cached = cached.shifted(cache_offset)
+                if cached is not None:
+                    self.log(f"♻️ ترجمه {language} از حافظه موقت بارگذاری شد")
+                    METRICS.inc("cache_hits_total", kind="translation")
+                    translations[language] = cached
+                    continue
+                
+                self.mark_stage("translate")
+                self.log(f"\n🌐 مرحله 3: ترجمه به {language}...")
+                translations[language] = self.translate_segments(
+                    segments,
+                    tgt_lang=language,
+                    src_lang=self.get_nllb_lang_code(source_lang)
+                )
+                
+                if not self.processing:
+                    return
+                
+                if translations[language] is not segments:
+                    self.store_cached_translation(cache_id, language, translations[language])
             
             # مرحله 4: ایجاد فایل زیرنویس
+            self.mark_stage("subtitle")
             self.log("\n📝 مرحله 4: ایجاد فایل زیرنویس ASS...")
-            subtitle_file = self.create_subtitle_file(segments, video_name)
+            for target in targets:
+                target['segments'] = translations[target['language']]
+                target['subtitle_file'] = self.create_subtitle_file(
+                    target['segments'],
+                    video_name,
+                    style=target['style'],
+                    output_name=target['name']
+                )
             
             if not self.processing:
                 return
             
-            # مرحله 5: چسباندن زیرنویس
+            # مرحله 5: چسباندن زیرنویس (خروجی‌های متعدد به صورت هم‌زمان)
+            self.mark_stage("hardsub")
             self.log("\n🎬 مرحله 5: چسباندن زیرنویس به ویدیو...")
-            output_file = self.hardcode_subtitle(video_file, subtitle_file, video_name)
+            if len(targets) == 1:
+                output_files = [self.hardcode_subtitle(
+                    video_file,
+                    targets[0]['subtitle_file'],
+                    video_name,
+                    segments=targets[0]['segments'],
+                    style=targets[0]['style'],
+                    output_name=targets[0]['name']
+                )]
+            else:
+                threads = max(1, (os.cpu_count() or 1) // len(targets))
+                self.log(f"⏳ چسباندن هم‌زمان {len(targets)} خروجی...")
+                with ThreadPoolExecutor(max_workers=len(targets)) as executor:
+                    futures = [
+                        executor.submit(
+                            self.hardcode_subtitle,
+                            video_file,
+                            target['subtitle_file'],
+                            video_name,
+                            segments=target['segments'],
+                            style=target['style'],
+                            output_name=target['name'],
+                            show_progress=False,
+                            threads=threads
+                        )
+                        for target in targets
+                    ]
+                    output_files = [future.result() for future in futures]
+            output_file = ", ".join(output_files)
+            status = "success"
             
             self.log("\n" + "="*60)
             self.log("✅ پردازش با موفقیت تکمیل شد!")
@@ -609,14 +1435,43 @@ class PersianSubtitleApp:
             
             
         except Exception as e:
+            status = "failed"
+            # نوع خطای اصلی (پیش از بسته‌بندی در Exception با پیام فارسی)
+            METRICS.inc(
+                "failures_total",
+                stage=self._stage or "init",
+                reason=type(e.__context__ or e).__name__
+            )
             self.log(f"\n❌ خطا در پردازش: {str(e)}")
             messagebox.showerror("خطا", f"خطا در پردازش:\n{str(e)}")
             raise e
         
         finally:
+            self.mark_stage(None)
+            METRICS.inc("files_processed_total", status=status)
+            if shared_segments is not None:
+                shared_segments.close()
+            if handoff_file and os.path.exists(handoff_file):
+                os.remove(handoff_file)
             self.log(f"✅ پایان پردازش: {video_name}")
         
     
+    def mark_stage(self, stage):
+        """ثبت مدت مرحله قبلی در متریک‌ها و شروع مرحله جدید (None = پایان)"""
+        now = time.monotonic()
+        if self._stage is not None:
+            METRICS.observe("stage_duration_seconds", now - self._stage_started, stage=self._stage)
+        self._stage, self._stage_started = stage, now
+    
+    def export_metrics(self):
+        """نوشتن متریک‌ها در فایل تعیین شده با PERSIAN_SUBTITLE_METRICS_FILE"""
+        if not METRICS_FILE:
+            return
+        try:
+            METRICS.write_textfile(METRICS_FILE)
+        except OSError as e:
+            self.log(f"⚠️ خطا در ذخیره متریک‌ها: {e}")
+    
     def extract_audio(self, video_file):
         """استخراج صدا از ویدیو"""
         try:
@@ -628,7 +1483,15 @@ class PersianSubtitleApp:
             )
             
             video = VideoFileClip(video_file)
-            video.audio.write_audiofile(audio_file, logger=None)
+            # صدای تک‌کاناله 16kHz (نرخ نمونه‌برداری Whisper و اثر انگشت صوتی)
+            video.audio.write_audiofile(
+                audio_file,
+                fps=16000,
+                nbytes=2,
+                codec='pcm_s16le',
+                ffmpeg_params=['-ac', '1'],
+                logger=None
+            )
             video.close()
             
             self.log(f"✅ صدا استخراج شد: {audio_file}")
@@ -637,36 +1500,221 @@ class PersianSubtitleApp:
         except Exception as e:
             raise Exception(f"خطا در استخراج صدا: {str(e)}")
     
-    def transcribe_audio(self, audio_file):
-        """تشخیص گفتار با Whisper + نوار پیشرفت"""
+    def compute_audio_fingerprint(self, audio_file):
+        """محاسبه اثر انگشت فشرده صدا (32 بیت برای هر فریم، روش Haitsma-Kalker)"""
         try:
-            from faster_whisper import WhisperModel
-            import torch
+            import wave
+            import numpy as np
             
-            self.log(f"⏳ در حال بارگذاری/دانلود مدل {self.model_size.get()}...")
-            self.log("⚠️ اگر اولین بار است، دانلود مدل ممکن است چند دقیقه طول بکشد. لطفاً صبر کنید...")
+            with wave.open(audio_file, 'rb') as wav:
+                rate = wav.getframerate()
+                channels = wav.getnchannels()
+                if wav.getsampwidth() != 2:
+                    raise Exception("فقط صدای 16 بیتی پشتیبانی می‌شود")
+                duration = wav.getnframes() / rate
+                
+                frame_size = 2048 * rate // 16000
+                hop = frame_size // 2
+                if wav.getnframes() < frame_size * 2:
+                    return None
+                
+                # 33 باند لگاریتمی بین 300 تا 2000 هرتز
+                freqs = np.fft.rfftfreq(frame_size, 1.0 / rate)
+                edges = np.geomspace(300, 2000, 34)
+                band_index = np.digitize(freqs, edges) - 1
+                valid = (band_index >= 0) & (band_index < 33)
+                window = np.hanning(frame_size).astype(np.float32)
+                
+                # خواندن و پردازش تکه‌تکه فایل (حدود 4096 فریم در هر تکه) تا فایل‌های چندساعته
+                # کامل در حافظه بارگذاری نشوند؛ انتهای هر تکه (frame_size - hop) به تکه بعد منتقل می‌شود
+                energies = []
+                tail = np.zeros(0, dtype=np.float32)
+                while True:
+                    data = wav.readframes(4096 * hop)
+                    if not data:
+                        break
+                    chunk = np.frombuffer(data, dtype=np.int16)
+                    if channels > 1:
+                        chunk = chunk.reshape(-1, channels).mean(axis=1)
+                    samples = np.concatenate([tail, chunk.astype(np.float32)])
+                    
+                    count = (len(samples) - frame_size) // hop + 1 if len(samples) >= frame_size else 0
+                    if count > 0:
+                        frames = np.lib.stride_tricks.sliding_window_view(samples, frame_size)[::hop][:count]
+                        spectrum = np.abs(np.fft.rfft(frames * window, axis=1)) ** 2
+                        band_energy = np.zeros((len(spectrum), 33), dtype=np.float64)
+                        np.add.at(band_energy.T, band_index[valid], spectrum[:, valid].T)
+                        energies.append(band_energy)
+                    tail = samples[count * hop:]
+            energy = np.concatenate(energies)
             
-            # فعال کردن نوار پیشرفت
-            self.progress_bar.start(10)
-            self.root.update()
+            band_diff = energy[:, :-1] - energy[:, 1:]
+            bits = (band_diff[1:] - band_diff[:-1]) > 0
+            fingerprint = np.packbits(bits, axis=1, bitorder='little').view('<u4').ravel()
             
-            # تشخیص سخت‌افزار
-            device = "cuda" if torch.cuda.is_available() else "cpu"
-            compute_type = "float16" if device == "cuda" else "int8"
+            return fingerprint, duration
             
-            self.log(f"🖥️ دستگاه پردازش: {device.upper()}")
+        except Exception as e:
+            self.log(f"⚠️ خطا در محاسبه اثر انگشت صوتی: {e}")
+            return None
+    
+    def open_fingerprint_index(self):
+        """باز کردن پایگاه داده محلی اثر انگشت‌های صوتی"""
+        CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        connection = sqlite3.connect(str(CACHE_DIR / "fingerprints.sqlite"))
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS fingerprints ("
+            "id INTEGER PRIMARY KEY, source TEXT, duration REAL, settings TEXT, "
+            "fingerprint BLOB, segments BLOB, created TEXT)"
+        )
+        # ستون زبان تشخیص داده شده (اضافه شده به جدول‌های قدیمی)
+        columns = {row[1] for row in connection.execute("PRAGMA table_info(fingerprints)")}
+        if 'language' not in columns:
+            connection.execute("ALTER TABLE fingerprints ADD COLUMN language TEXT")
+        connection.execute(
+            "CREATE INDEX IF NOT EXISTS idx_fingerprints_duration "
+            "ON fingerprints (settings, duration)"
+        )
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS languages ("
+            "path TEXT, size INTEGER, mtime INTEGER, language TEXT, probability REAL, "
+            "PRIMARY KEY (path, size, mtime))"
+        )
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS translations ("
+            "fingerprint_id INTEGER, language TEXT, segments BLOB, "
+            "PRIMARY KEY (fingerprint_id, language))"
+        )
+        return connection
+    
+    def fingerprint_settings(self, model_size=None):
+        """کلید تنظیماتی که روی متن تشخیص گفتار اثر دارند (مدل واقعاً استفاده شده)"""
+        return f"{model_size or self.model_size.get()}|{self.video_language.get()}"
+    
+    def fingerprint_lookup_settings(self):
+        """کلیدهای قابل قبول برای جستجو؛ در حالت auto متن هر مدلی (ابتدا دقیق‌ترین) پذیرفته می‌شود"""
+        if self.model_size.get() != "auto":
+            return [self.fingerprint_settings()]
+        # "auto" برای ردیف‌هایی که پیش از ثبت مدل واقعی ذخیره شده‌اند
+        return [self.fingerprint_settings(model) for model in reversed(WHISPER_MODELS)] + [self.fingerprint_settings()]
+    
+    def find_duplicate_audio(self, fingerprint, duration):
+        """جستجوی صدای تقریباً یکسان در فهرست
+        
+        خروجی: (شناسه، متن تشخیص گفتار هم‌تراز شده با صدای فعلی، زبان، جابه‌جایی زمانی به ثانیه)
+        """
+        import numpy as np
+        
+        max_shift = 8  # جابه‌جایی مجاز (فریم) برای انکودهای مجدد
+        max_error = 0.2  # حداکثر نرخ خطای بیت برای تشخیص تکراری
+        frame_seconds = 1024 / 16000  # فاصله فریم‌های اثر انگشت (hop روی صدای 16kHz استخراج شده)
+        tolerance = max(1.0, duration * 0.01)
+        
+        connection = self.open_fingerprint_index()
+        try:
+            settings = self.fingerprint_lookup_settings()
+            rows = connection.execute(
+                "SELECT id, source, settings, fingerprint, segments, language FROM fingerprints "
+                f"WHERE settings IN ({', '.join('?' * len(settings))}) AND duration BETWEEN ? AND ?",
+                settings + [duration - tolerance, duration + tolerance]
+            ).fetchall()
+        finally:
+            connection.close()
+        
+        rows.sort(key=lambda row: settings.index(row[2]))
+        for row_id, source, _, blob, segments_blob, language in rows:
+            candidate = np.frombuffer(blob, dtype='<u4')
+            best = None
+            for shift in range(-max_shift, max_shift + 1):
+                a = fingerprint[max(shift, 0):]
+                b = candidate[max(-shift, 0):]
+                length = min(len(a), len(b))
+                if length < 64:
+                    continue
+                diff = np.bitwise_xor(a[:length], b[:length])
+                error = np.unpackbits(diff.view(np.uint8)).sum() / (length * 32)
+                if best is None or error < best[0]:
+                    best = (error, shift)
             
-            # بارگذاری مدل (اینجا زمان‌بر است)
-            model = WhisperModel(
-                self.model_size.get(),
-                device=device,
-                compute_type=compute_type
-            )
+            if best is None or best[0] > max_error:
+                continue
+            try:
+                store = SegmentStore.from_bytes(segments_blob)
+            except (ValueError, TypeError):
+                # ردیف‌های قدیمی (متن JSON به جای قالب باینری) نادیده گرفته می‌شوند
+                continue
             
-            # غیرفعال کردن نوار پیشرفت بعد از لود مدل
-            self.progress_bar.stop()
+            # shift مثبت یعنی صدای فعلی دیرتر شروع می‌شود (مثلاً سکوت اضافه در ابتدا)
+            error, shift = best
+            offset = shift * frame_seconds
+            self.log(
+                f"♻️ فایل تکراری یافت شد: {os.path.basename(source)} "
+                f"(خطای بیت {error:.2f}، جابه‌جایی {offset * 1000:+.0f}ms)"
+            )
+            return row_id, (store.shifted(offset) if shift else store), language, offset
+        
+        return None
+    
+    def store_audio_fingerprint(self, video_file, fingerprint, duration, segments, language=None):
+        """ذخیره اثر انگشت و متن تشخیص گفتار برای استفاده در اجراهای بعدی"""
+        # در حالت auto کلید با مدل انتخاب شده برای همین فایل ساخته می‌شود
+        model_size = self._model_choice[1][0] if self._model_choice else None
+        try:
+            connection = self.open_fingerprint_index()
+            with connection:
+                cursor = connection.execute(
+                    "INSERT INTO fingerprints (source, duration, settings, fingerprint, segments, created, language) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (video_file, duration, self.fingerprint_settings(model_size),
+                     fingerprint.astype('<u4').tobytes(), segments.to_bytes(), datetime.now().isoformat(), language)
+                )
+            connection.close()
+            return cursor.lastrowid
+        except Exception as e:
+            self.log(f"⚠️ خطا در ذخیره اثر انگشت صوتی: {e}")
+            return None
+    
+    def load_cached_translation(self, cache_id, language):
+        """بارگذاری ترجمه ذخیره شده برای یک فایل تکراری"""
+        if cache_id is None:
+            return None
+        connection = self.open_fingerprint_index()
+        try:
+            row = connection.execute(
+                "SELECT segments FROM translations WHERE fingerprint_id = ? AND language = ?",
+                (cache_id, language)
+            ).fetchone()
+        finally:
+            connection.close()
+        try:
+            return SegmentStore.from_bytes(row[0]) if row else None
+        except (ValueError, TypeError):
+            return None
+    
+    def store_cached_translation(self, cache_id, language, segments):
+        """ذخیره ترجمه برای استفاده مجدد در فایل‌های تکراری"""
+        if cache_id is None:
+            return
+        try:
+            connection = self.open_fingerprint_index()
+            with connection:
+                connection.execute(
+                    "INSERT OR REPLACE INTO translations (fingerprint_id, language, segments) "
+                    "VALUES (?, ?, ?)",
+                    (cache_id, language, segments.to_bytes())
+                )
+            connection.close()
+        except Exception as e:
+            self.log(f"⚠️ خطا در ذخیره ترجمه: {e}")
+    
+    def transcribe_audio(self, audio_file, language=None):
+        """تشخیص گفتار با Whisper + نوار پیشرفت"""
+        try:
+            model = self.prepare_whisper_model(audio_file)
             
-            language = None if self.video_language.get() == "auto" else self.video_language.get()
+            if language is None:
+                language = self.video_language.get()
+            language = None if language == "auto" else language
             
             self.log("🎯 در حال تشخیص گفتار (Transcription)...")
             segments, info = model.transcribe(
@@ -675,72 +1723,434 @@ class PersianSubtitleApp:
                 language=language
             )
             
-            segments_list = list(segments)
+            # نگهداری فشرده به جای لیست اشیای Segment (توکن‌ها، کلمات و ...)
+            store = SegmentStore.from_segments(segments)
             
-            self.log(f"✅ تعداد {len(segments_list)} بخش شناسایی شد")
+            self.log(f"✅ تعداد {len(store)} بخش شناسایی شد")
             self.log(f"📊 زبان شناسایی شده: {info.language}")
             
-            return segments_list
+            return store
             
         except Exception as e:
             self.progress_bar.stop()
             raise Exception(f"خطا در تشخیص گفتار: {str(e)}")
     
-    def translate_segments(self, segments):
-        """ترجمه زیرنویس‌ها به فارسی"""
+    def prepare_whisper_model(self, audio_file):
+        """انتخاب و بارگذاری مدل Whisper برای این فایل (با نوار پیشرفت)"""
+        import torch
+        
+        # مدل قبلاً برای همین فایل و همین انتخاب کاربر آماده شده (مثلاً در مرحله تشخیص زبان)
+        request = (audio_file, self.model_size.get())
+        if self._model_choice is not None and self._model_choice[0] == request:
+            return self.get_whisper_model(*self._model_choice[1])
+        
+        try:
+            # تشخیص سخت‌افزار
+            device = "cuda" if torch.cuda.is_available() else "cpu"
+            
+            self.log(f"🖥️ دستگاه پردازش: {device.upper()}")
+            
+            # فعال کردن نوار پیشرفت
+            self.progress_bar.start(10)
+            self.root.update()
+            
+            if self.model_size.get() == "auto":
+                model_size, compute_type = self.select_model_by_speed(audio_file, device)
+            else:
+                model_size, compute_type = self.model_size.get(), COMPUTE_TYPES[device][0]
+            
+            self.log(f"⏳ در حال بارگذاری/دانلود مدل {model_size}...")
+            self.log("⚠️ اگر اولین بار است، دانلود مدل ممکن است چند دقیقه طول بکشد. لطفاً صبر کنید...")
+            
+            # بارگذاری مدل (اینجا زمان‌بر است)
+            model = self.get_whisper_model(model_size, device, compute_type)
+            self._model_choice = (request, (model_size, device, compute_type))
+            
+            return model
+        finally:
+            # غیرفعال کردن نوار پیشرفت بعد از لود مدل
+            self.progress_bar.stop()
+    
+    def detect_language(self, video_file, audio_file, sample_seconds=30):
+        """تشخیص زبان روی چند ثانیه اول صدا با همان مدل Whisper (با حافظه موقت برای هر فایل)"""
+        try:
+            stat = os.stat(video_file)
+            key = (os.path.abspath(video_file), stat.st_size, stat.st_mtime_ns)
+            
+            connection = self.open_fingerprint_index()
+            try:
+                row = connection.execute(
+                    "SELECT language, probability FROM languages "
+                    "WHERE path = ? AND size = ? AND mtime = ?",
+                    key
+                ).fetchone()
+            finally:
+                connection.close()
+            
+            if row:
+                language, probability = row
+                self.log(f"🌐 زبان (از حافظه موقت): {language} ({probability:.0%})")
+                return language
+            
+            self.log(f"\n🌐 تشخیص زبان روی {sample_seconds} ثانیه اول صدا...")
+            model = self.prepare_whisper_model(audio_file)
+            sample = self.read_audio_sample(audio_file, sample_seconds)
+            # تشخیص زبان در transcribe فوراً انجام می‌شود؛ بخش‌ها (generator) مصرف نمی‌شوند
+            _, info = model.transcribe(sample, beam_size=1)
+            language, probability = info.language, info.language_probability
+            
+            self.log(f"🌐 زبان تشخیص داده شده: {language} ({probability:.0%})")
+            
+            connection = self.open_fingerprint_index()
+            with connection:
+                connection.execute(
+                    "INSERT OR REPLACE INTO languages (path, size, mtime, language, probability) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    key + (language, probability)
+                )
+            connection.close()
+            return language
+            
+        except Exception as e:
+            self.log(f"⚠️ خطا در تشخیص زبان: {e}")
+            return None
+    
+    def get_whisper_model(self, model_size, device, compute_type):
+        """بارگذاری مدل Whisper (آخرین مدل برای فایل‌های بعدی صف نگه داشته می‌شود)"""
+        from faster_whisper import WhisperModel
+        
+        key = (model_size, device, compute_type)
+        with self._model_lock:
+            if self._whisper_model is None or self._whisper_model[0] != key:
+                model_name = ModelStore.whisper_name(model_size)
+                source = self.resolve_model_source(model_name, model_size)
+                # آزاد کردن مدل قبلی پیش از بارگذاری مدل جدید
+                self._whisper_model = None
+                started = time.monotonic()
+                self._whisper_model = (key, WhisperModel(source, device=device, compute_type=compute_type))
+                METRICS.inc("model_loads_total", model=model_name)
+                METRICS.observe("model_load_duration_seconds", time.monotonic() - started, model=model_name)
+            return self._whisper_model[1]
+    
+    def get_translator(self):
+        """بارگذاری pipeline ترجمه NLLB (زبان مبدا/مقصد هنگام فراخوانی تعیین می‌شود)"""
+        from transformers import pipeline
+        
+        with self._model_lock:
+            if self._translator is None:
+                model_name = ModelStore.translator_name()
+                source = self.resolve_model_source(model_name, ModelStore.TRANSLATION_MODEL)
+                started = time.monotonic()
+                self._translator = pipeline("translation", model=source)
+                METRICS.inc("model_loads_total", model=model_name)
+                METRICS.observe("model_load_duration_seconds", time.monotonic() - started, model=model_name)
+            return self._translator
+    
+    def get_model_store(self):
+        return ModelStore(self.model_store_dir.get())
+    
+    def model_available(self, model_size):
+        """آیا مدل بدون اینترنت قابل بارگذاری است؟ (در حالت آنلاین همیشه بله)"""
+        if not self.offline_models.get():
+            return True
+        return self.get_model_store().has(ModelStore.whisper_name(model_size))
+    
+    def resolve_model_source(self, name, default):
+        """مسیر محلی مدل در مخزن (با بررسی checksum) یا شناسه Hub در حالت آنلاین"""
+        store = self.get_model_store()
+        if store.has(name):
+            # کلید شامل مسیر مخزن است تا تغییر پوشه مخزن بررسی checksum را دور نزند
+            key = (store.root.resolve(), name)
+            if key not in self._verified_models:
+                self.log(f"🔐 بررسی checksum مدل {name}...")
+                if not store.verify(name):
+                    raise Exception(f"checksum مدل {name} با manifest مطابقت ندارد")
+                self._verified_models.add(key)
+            return str(store.model_dir(name))
+        if self.offline_models.get():
+            raise Exception(f"مدل {name} در مخزن محلی ({store.root}) موجود نیست")
+        return default
+    
+    def warm_up_models(self):
+        """بارگذاری مدل‌های موجود در مخزن و یک استنتاج کوتاه برای حذف هزینه اولین اجرا"""
         try:
-            from transformers import pipeline
+            import numpy as np
+            import torch
+            
+            store = self.get_model_store()
+            model_size = self.model_size.get()
+            if model_size != "auto" and store.has(ModelStore.whisper_name(model_size)):
+                device = "cuda" if torch.cuda.is_available() else "cpu"
+                self.log(f"🔥 آماده‌سازی مدل {model_size} در پس‌زمینه...")
+                model = self.get_whisper_model(model_size, device, COMPUTE_TYPES[device][0])
+                segments, _ = model.transcribe(np.zeros(16000, dtype=np.float32), language="en")
+                for _ in segments:
+                    pass
+            
+            if store.has(ModelStore.translator_name()):
+                self.log("🔥 آماده‌سازی مدل ترجمه در پس‌زمینه...")
+                self.get_translator()("Hello", src_lang="eng_Latn", tgt_lang=PERSIAN_NLLB_CODE, max_length=16)
             
+            self.log("✅ آماده‌سازی مدل‌ها تکمیل شد")
+        except Exception as e:
+            self.log(f"⚠️ آماده‌سازی مدل‌ها ناموفق بود: {e}")
+    
+    def fetch_models(self):
+        """دریافت مدل Whisper انتخاب شده و مدل ترجمه در مخزن محلی"""
+        def worker():
+            try:
+                store = self.get_model_store()
+                sizes = WHISPER_MODELS if self.model_size.get() == "auto" else [self.model_size.get()]
+                for model_size in sizes:
+                    self.log(f"⬇️ دریافت مدل {model_size} در {store.root}...")
+                    store.fetch_whisper(model_size)
+                self.log("⬇️ دریافت مدل ترجمه...")
+                store.fetch_translator()
+                self.log("✅ مدل‌ها در مخزن محلی ذخیره شدند")
+                self.warm_up_models()
+            except Exception as e:
+                self.log(f"❌ خطا در دریافت مدل‌ها: {e}")
+        
+        threading.Thread(target=worker, daemon=True).start()
+    
+    def import_models(self):
+        """وارد کردن مدل‌ها از پوشه مخزن دیگر"""
+        directory = filedialog.askdirectory(title="انتخاب پوشه مخزن مدل‌ها (حاوی manifest.json)")
+        if not directory:
+            return
+        
+        def worker():
+            try:
+                self.log(f"📥 وارد کردن مدل‌ها از {directory}...")
+                store = self.get_model_store()
+                imported, failed = store.import_store(directory)
+                for name in imported:
+                    # مدل جایگزین شده باید پیش از بارگذاری دوباره بررسی شود
+                    self._verified_models.discard((store.root.resolve(), name))
+                    self.log(f"✅ {name}")
+                for name in failed:
+                    self.log(f"❌ رد شد (checksum نادرست یا نام نامعتبر): {name}")
+                self.warm_up_models()
+            except Exception as e:
+                self.log(f"❌ خطا در وارد کردن مدل‌ها: {e}")
+        
+        threading.Thread(target=worker, daemon=True).start()
+    
+    def select_model_store_dir(self):
+        """انتخاب پوشه مخزن مدل‌ها"""
+        directory = filedialog.askdirectory(title="انتخاب پوشه مخزن مدل‌ها")
+        if directory:
+            self.model_store_dir.set(directory)
+            self.log(f"📦 مخزن مدل‌ها: {directory}")
+    
+    def read_audio_sample(self, audio_file, seconds, offset=0.0):
+        """خواندن بخشی از فایل WAV به صورت آرایه float32 (بدون دیکود کل فایل)"""
+        import wave
+        import numpy as np
+        
+        with wave.open(audio_file, 'rb') as wav:
+            rate = wav.getframerate()
+            channels = wav.getnchannels()
+            wav.setpos(min(int(offset * rate), wav.getnframes()))
+            samples = np.frombuffer(wav.readframes(int(seconds * rate)), dtype=np.int16)
+        
+        if channels > 1:
+            samples = samples.reshape(-1, channels).mean(axis=1)
+        return samples.astype(np.float32) / 32768.0
+    
+    def get_audio_duration(self, audio_file):
+        """مدت فایل WAV (ثانیه)"""
+        import wave
+        with wave.open(audio_file, 'rb') as wav:
+            return wav.getnframes() / wav.getframerate()
+    
+    def load_speed_profile(self):
+        """ضریب بلادرنگ سنجیده شده مدل‌ها روی این سیستم"""
+        path = CACHE_DIR / f"rtf_{socket.gethostname()}.json"
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+    
+    def save_speed_profile(self, profile):
+        """ذخیره ضریب بلادرنگ مدل‌ها برای اجراهای بعدی"""
+        CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        path = CACHE_DIR / f"rtf_{socket.gethostname()}.json"
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(profile, f, indent=2)
+    
+    def update_speed_profile(self, key, value):
+        """به‌روزرسانی یک مقدار در پروفایل سرعت سیستم"""
+        with self._speed_lock:
+            profile = self.load_speed_profile()
+            profile[key] = value
+            self.save_speed_profile(profile)
+    
+    def benchmark_model(self, sample, model_size, device, compute_type):
+        """سنجش ضریب بلادرنگ (زمان پردازش / طول صدا) یک مدل روی نمونه صوتی"""
+        model = self.get_whisper_model(model_size, device, compute_type)
+        language = None if self.video_language.get() == "auto" else self.video_language.get()
+        
+        # اجرای کوتاه بدون زمان‌سنجی تا هزینه اولین استنتاج (تخصیص حافظه و ...) در ضریب بلادرنگ نیاید
+        segments, _ = model.transcribe(sample[:16000], beam_size=5, language=language)
+        for _ in segments:
+            pass
+        
+        started = time.monotonic()
+        segments, _ = model.transcribe(sample, beam_size=5, language=language)
+        for _ in segments:
+            pass
+        return (time.monotonic() - started) / (len(sample) / 16000)
+    
+    def select_model_by_speed(self, audio_file, device, sample_seconds=30):
+        """انتخاب دقیق‌ترین مدلی که صف فعلی را در مهلت تعیین شده پردازش کند"""
+        duration = self.get_audio_duration(audio_file)
+        budget = self.target_minutes.get() * 60
+        workload = duration * self.remaining_files
+        # فرض: فایل‌های باقی‌مانده صف طولی مشابه فایل فعلی دارند
+        required_rtf = budget / workload if workload else float('inf')
+        
+        self.log(f"📐 انتخاب خودکار مدل: حداکثر ضریب بلادرنگ مجاز {required_rtf:.2f}")
+        
+        profile = self.load_speed_profile()
+        sample = None
+        chosen = None
+        min_sample = 5 * 16000  # نمونه کوتاه‌تر فقط در همین اجرا استفاده می‌شود و ذخیره نمی‌شود
+        
+        # مدل‌ها از سریع به دقیق؛ اولین مدلی که به مهلت نرسد مدل‌های بزرگ‌تر را هم رد می‌کند
+        for model_size in WHISPER_MODELS:
+            if not self.model_available(model_size):
+                continue
+            best = None
+            for compute_type in COMPUTE_TYPES[device]:
+                key = f"{device}|{model_size}|{compute_type}"
+                # خطای سنجش (مثلاً کمبود موقت حافظه GPU) فقط در همین اجرا مدل را کنار می‌گذارد
+                if profile.get(key) is None and key not in self._benchmark_failures:
+                    if sample is None:
+                        sample = self.read_audio_sample(audio_file, sample_seconds, offset=min(60.0, duration / 4))
+                    self.log(f"⏱️ سنجش سرعت {model_size} ({compute_type})...")
+                    try:
+                        profile[key] = self.benchmark_model(sample, model_size, device, compute_type)
+                    except Exception as e:
+                        self.log(f"⚠️ سنجش {model_size} ({compute_type}) ناموفق بود: {e}")
+                        self._benchmark_failures.add(key)
+                    else:
+                        if len(sample) >= min_sample:
+                            self.update_speed_profile(key, profile[key])
+                rtf = profile.get(key)
+                if rtf is not None and (best is None or rtf < best[1]):
+                    best = (compute_type, rtf)
+            
+            if best is None:
+                continue
+            self.log(f"📊 {model_size}: ضریب بلادرنگ {best[1]:.2f} ({best[0]})")
+            if best[1] > required_rtf:
+                if chosen is None:
+                    chosen = (model_size, best[0])
+                    self.log("⚠️ هیچ مدلی به مهلت نمی‌رسد؛ سریع‌ترین مدل انتخاب شد")
+                break
+            chosen = (model_size, best[0])
+        
+        if chosen is None:
+            chosen = (WHISPER_MODELS[0], COMPUTE_TYPES[device][0])
+        
+        self.log(f"✅ مدل انتخاب شده: {chosen[0]} ({chosen[1]})")
+        return chosen
+    
+    def translate_segments(self, segments, tgt_lang=PERSIAN_NLLB_CODE, src_lang=None):
+        """ترجمه زیرنویس‌ها (پیش‌فرض: فارسی)"""
+        try:
             self.log("⏳ در حال بارگذاری مدل ترجمه...")
             
-            translator = pipeline(
-                "translation",
-                model="facebook/nllb-200-distilled-600M",
-                src_lang=self.get_nllb_lang_code(self.video_language.get()),
-                tgt_lang="fas_Arab"
-            )
+            translator = self.get_translator()
+            src_lang = src_lang or self.get_nllb_lang_code(self.video_language.get())
             
-            translated_segments = []
+            texts = []
             total = len(segments)
             
             for i, segment in enumerate(segments):
                 if not self.processing:
-                    break
+                    # بخش‌های ترجمه نشده با متن اصلی باقی می‌مانند
+                    texts.append(segment.text)
+                    continue
                 
                 self.log(f"🔄 ترجمه بخش {i+1}/{total}...")
                 
-                translation = translator(segment.text, max_length=400)[0]['translation_text']
-                
-                # نگه‌داری زمان‌بندی اصلی
-                segment.text = translation
-                translated_segments.append(segment)
+                translation = translator(
+                    segment.text,
+                    src_lang=src_lang,
+                    tgt_lang=tgt_lang,
+                    max_length=400
+                )[0]['translation_text']
+                texts.append(translation)
             
             self.log("✅ ترجمه تکمیل شد")
-            return translated_segments
+            # نگه‌داری زمان‌بندی اصلی (آرایه‌های زمانی مشترک می‌مانند)
+            return segments.with_texts(texts)
             
         except Exception as e:
             self.log(f"⚠️ خطا در ترجمه، از متن اصلی استفاده می‌شود: {str(e)}")
             return segments
     
-    def get_nllb_lang_code(self, lang):
+    def get_nllb_lang_code(self, lang, default='eng_Latn'):
         """تبدیل کد زبان به فرمت NLLB"""
-        lang_map = {
-            'en': 'eng_Latn',
-            'ar': 'arb_Arab',
-            'fr': 'fra_Latn',
-            'de': 'deu_Latn',
-            'es': 'spa_Latn'
+        return WHISPER_TO_NLLB.get(lang, default)
+    
+    def needs_translation(self, tgt_lang, source=None):
+        """آیا متن تشخیص گفتار باید به زبان مقصد ترجمه شود؟ (None = زبان اصلی)"""
+        if source is None:
+            source = self.video_language.get()
+        if tgt_lang is None or source == 'auto':
+            return False
+        # زبان‌هایی که NLLB کد مشخصی برایشان ندارد بدون ترجمه می‌مانند
+        source_code = self.get_nllb_lang_code(source, default=None)
+        return source_code is not None and source_code != tgt_lang
+    
+    def current_style(self):
+        """استایل فعلی زیرنویس از تنظیمات ظاهری"""
+        return {
+            'font_name': self.font_name.get(),
+            'font_size': self.font_size.get(),
+            'font_color': self.font_color.get(),
+            'outline_color': self.outline_color.get(),
+            'outline_width': self.outline_width.get(),
+            'position': self.subtitle_position.get()
         }
-        return lang_map.get(lang, 'eng_Latn')
+    
+    def build_output_targets(self, source_lang=None):
+        """فهرست خروجی‌ها: زیرنویس فارسی + زبان اصلی و پیش‌تنظیم‌های انتخاب شده
+        
+        اگر زبان مبدا قابل ترجمه نباشد (یا تشخیص داده نشود) به جای خروجی فارسی
+        فقط زیرنویس زبان اصلی ساخته می‌شود تا متن ترجمه نشده با نام فارسی ذخیره نشود.
+        """
+        style = self.current_style()
+        source = source_lang or self.video_language.get()
+        persian = self.get_nllb_lang_code(source, default=None) is not None
+        
+        targets = []
+        if persian:
+            targets.append({'name': 'persian', 'language': PERSIAN_NLLB_CODE, 'style': style})
+        else:
+            reason = "زبان ویدیو تشخیص داده نشد" if source == 'auto' else f"ترجمه از زبان «{source}» پشتیبانی نمی‌شود"
+            self.log(f"⚠️ {reason}؛ به جای خروجی فارسی فقط زیرنویس زبان اصلی ساخته می‌شود")
+        
+        if (self.output_original.get() or not persian) and source != 'fa':
+            targets.append({'name': 'original', 'language': None, 'style': style})
+        
+        for preset, (_, overrides) in STYLE_PRESETS.items():
+            if persian and self.style_preset_vars[preset].get():
+                targets.append({
+                    'name': f"persian_{preset}",
+                    'language': PERSIAN_NLLB_CODE,
+                    'style': dict(style, **overrides)
+                })
+        
+        return targets
     
     def fix_text_direction(self, text):
         """اصلاح جهت متن و حروف برای نمایش صحیح فارسی در زیرنویس هاردساب"""
         try:
-            # اگر کتابخانه‌ها لود نشده باشند، همان متن اصلی را برگردان
-            if 'arabic_reshaper' not in sys.modules or 'bidi' not in sys.modules:
-                import arabic_reshaper
-                from bidi.algorithm import get_display
-            
             # بازآرایی حروف (چسباندن حروف جدا)
             reshaped_text = arabic_reshaper.reshape(text)
             # اصلاح جهت (راست‌چین کردن)
@@ -750,73 +2160,134 @@ class PersianSubtitleApp:
             self.log(f"⚠️ خطا در اصلاح فونت فارسی: {e}")
             return text
         
-    def create_subtitle_file(self, segments, video_name):
-        """ایجاد فایل زیرنویس ASS"""
+    def create_subtitle_file(self, segments, video_name, subtitle_file=None, extra_formats=('srt', 'vtt'),
+                             style=None, output_name="persian"):
+        """ایجاد فایل زیرنویس ASS (و SRT/WebVTT در همان پیمایش)"""
         try:
-            import pysubs2
-            
-            subs = pysubs2.SSAFile()
-            
-            # تعریف استایل
-            style = pysubs2.SSAStyle()
-            style.fontname = self.font_name.get()
-            style.fontsize = self.font_size.get()
-            style.primarycolor = pysubs2.Color(*self.hex_to_rgb(self.font_color.get()))
-            style.outlinecolor = pysubs2.Color(*self.hex_to_rgb(self.outline_color.get()))
-            style.outline = self.outline_width.get()
-            style.bold = True
-            
-            # تنظیم موقعیت
-            alignment_map = {
-                'bottom': 2,
-                'top': 8,
-                'bottom-left': 1,
-                'bottom-right': 3
-            }
-            style.alignment = alignment_map.get(self.subtitle_position.get(), 2)
-            
-            subs.styles["Default"] = style
-            
-            # اضافه کردن رویدادها
-            for segment in segments:
-                # === تغییر مهم: اصلاح متن برای هاردساب ===
-                # برای فایل ASS که قرار است هاردساب شود، باید متن را برعکس کنیم
-                display_text = self.fix_text_direction(segment.text)
-                
-                event = pysubs2.SSAEvent(
-                    start=int(segment.start * 1000),
-                    end=int(segment.end * 1000),
-                    text=display_text
+            if subtitle_file is None:
+                subtitle_file = os.path.join(
+                    self.output_dir.get(),
+                    f"{video_name}_{output_name}.ass"
                 )
-                subs.append(event)
             
-            subtitle_file = os.path.join(
-                self.output_dir.get(),
-                f"{video_name}_persian.ass"
+            # هدر و استایل فقط یک بار با pysubs2 ساخته می‌شود و رویدادها مستقیم نوشته می‌شوند
+            base_path = os.path.splitext(subtitle_file)[0]
+            self.write_subtitle_files(
+                segments,
+                self.build_ass_header(style),
+                subtitle_file,
+                {fmt: f"{base_path}.{fmt}" for fmt in extra_formats}
             )
             
-            subs.save(subtitle_file)
-            
             self.log(f"✅ فایل زیرنویس ایجاد شد: {subtitle_file}")
             return subtitle_file
             
         except Exception as e:
             raise Exception(f"خطا در ایجاد فایل زیرنویس: {str(e)}")
     
-    def hardcode_subtitle(self, video_file, subtitle_file, video_name):
+    def build_ass_header(self, style=None):
+        """ساخت هدر و استایل فایل ASS با pysubs2 (بدون رویداد)"""
+        import pysubs2
+        
+        subs = pysubs2.SSAFile()
+        options = style or self.current_style()
+        
+        # تعریف استایل
+        style = pysubs2.SSAStyle()
+        style.fontname = options['font_name']
+        style.fontsize = options['font_size']
+        style.primarycolor = pysubs2.Color(*self.hex_to_rgb(options['font_color']))
+        style.outlinecolor = pysubs2.Color(*self.hex_to_rgb(options['outline_color']))
+        style.outline = options['outline_width']
+        style.bold = True
+        
+        # تنظیم موقعیت
+        alignment_map = {
+            'bottom': 2,
+            'top': 8,
+            'bottom-left': 1,
+            'bottom-right': 3
+        }
+        style.alignment = alignment_map.get(options['position'], 2)
+        
+        subs.styles["Default"] = style
+        return subs.to_string("ass")
+    
+    def write_subtitle_files(self, segments, ass_header, ass_file, extra_files, chunk_size=1024):
+        """نوشتن جریانی رویدادها در ASS و SRT/WebVTT (هم‌ارز بایت به بایت با خروجی pysubs2)"""
+        files = {'ass': open(ass_file, 'w', encoding='utf-8')}
+        try:
+            for fmt, path in extra_files.items():
+                files[fmt] = open(path, 'w', encoding='utf-8')
+            
+            files['ass'].write(ass_header)
+            if 'vtt' in files:
+                files['vtt'].write("WEBVTT\n\n")
+            
+            chunk = []
+            index = 1
+            for segment in segments:
+                chunk.append(segment)
+                if len(chunk) >= chunk_size:
+                    self.write_subtitle_chunk(files, chunk, index)
+                    index += len(chunk)
+                    chunk = []
+            if chunk:
+                self.write_subtitle_chunk(files, chunk, index)
+        finally:
+            for f in files.values():
+                f.close()
+    
+    def write_subtitle_chunk(self, files, chunk, first_index):
+        """نوشتن یک دسته رویداد با قالب‌بندی دسته‌ای زمان‌ها"""
+        # زمان‌ها مانند pysubs2.SSAEvent به میلی‌ثانیه صحیح تبدیل می‌شوند
+        starts = [max(int(segment.start * 1000), 0) for segment in chunk]
+        ends = [max(int(segment.end * 1000), 0) for segment in chunk]
+        
+        ass_starts = format_ass_timestamps(starts)
+        ass_ends = format_ass_timestamps(ends)
+        # === تغییر مهم: اصلاح متن برای هاردساب ===
+        # برای فایل ASS که قرار است هاردساب شود، باید متن را برعکس کنیم
+        files['ass'].write(''.join(
+            f"Dialogue: 0,{start},{end},Default,,0,0,0,,{self.fix_text_direction(segment.text)}\n"
+            for start, end, segment in zip(ass_starts, ass_ends, chunk)
+        ))
+        
+        # SRT/WebVTT توسط پخش‌کننده رندر می‌شوند و متن منطقی (بدون بازآرایی) لازم دارند
+        if 'srt' in files or 'vtt' in files:
+            srt_starts = format_srt_timestamps(starts)
+            srt_ends = format_srt_timestamps(ends)
+            texts = [plain_subtitle_text(segment.text) for segment in chunk]
+        
+        for fmt, separator in (('srt', ','), ('vtt', '.')):
+            if fmt not in files:
+                continue
+            files[fmt].write(''.join(
+                f"{number}\n{start.replace(',', separator)} --> {end.replace(',', separator)}\n{text}\n\n"
+                for number, start, end, text in zip(
+                    range(first_index, first_index + len(chunk)), srt_starts, srt_ends, texts
+                )
+            ))
+    
+    def hardcode_subtitle(self, video_file, subtitle_file, video_name, segments=None, style=None,
+                          output_name="persian", show_progress=True, threads=None):
         """چسباندن زیرنویس به ویدیو با اصلاح مسیر ویندوز"""
         try:
+            # حالت موازی برای ویدیوهای طولانی (در صورت امکان)
+            if segments is not None and self.parallel_segments.get() > 1:
+                output_file = self.hardcode_subtitle_parallel(
+                    video_file, segments, video_name, style, output_name, threads=threads
+                )
+                if output_file:
+                    return output_file
+                self.log("ℹ️ ادامه با حالت تک‌پردازشی FFmpeg...")
+
             output_file = os.path.join(
                 self.output_dir.get(),
-                f"{video_name}_with_persian_subtitle.mp4"
+                f"{video_name}_with_{output_name}_subtitle.mp4"
             )
             
-            # === اصلاح مسیر برای ویندوز (فرمت FFmpeg) ===
-            # در ویندوز، FFmpeg با \ مشکل دارد و : باید اسکیپ شود
-            if os.name == 'nt':
-                sub_path_fixed = subtitle_file.replace('\\', '/').replace(':', '\\:')
-            else:
-                sub_path_fixed = subtitle_file
+            sub_path_fixed = self.ffmpeg_subtitle_path(subtitle_file)
 
             # دستور FFmpeg
             cmd = [
@@ -827,23 +2298,20 @@ class PersianSubtitleApp:
                 '-y', # بازنویسی فایل اگر وجود داشت
                 output_file
             ]
+            if threads:
+                cmd[-2:-2] = ['-threads', str(threads)]
             
             self.log(f"⏳ در حال اجرای FFmpeg برای {video_name}...")
             # self.log(f"دستور: {' '.join(cmd)}") # برای دیباگ
             
-            # استفاده از startupinfo برای مخفی کردن پنجره کنسول FFmpeg در ویندوز
-            startupinfo = None
-            if os.name == 'nt':
-                startupinfo = subprocess.STARTUPINFO()
-                startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
-            
+            started = time.monotonic()
             process = subprocess.Popen(
                 cmd,
                 stdout=subprocess.PIPE,
                 stderr=subprocess.PIPE,
                 universal_newlines=True,
                 encoding='utf-8', # تنظیم انکدینگ برای جلوگیری از خطای کاراکتر
-                startupinfo=startupinfo
+                startupinfo=self.get_startupinfo()
             )
             
             # خواندن خروجی برای نمایش زنده وضعیت
@@ -851,7 +2319,7 @@ class PersianSubtitleApp:
                 line = process.stderr.readline()
                 if not line:
                     break
-                if 'time=' in line and self.processing:
+                if 'time=' in line and self.processing and show_progress:
                     # استخراج زمان پردازش شده برای نمایش به کاربر
                     time_str = line.split('time=')[1].split(' ')[0]
                     self.log(f"⏳ پیشرفت: {time_str}")
@@ -860,7 +2328,11 @@ class PersianSubtitleApp:
             process.wait()
             
             if process.returncode == 0:
-                self.log("✅ زیرنویس با موفقیت چسبانده شد")
+                # اندازه‌گیری زیر بار خروجی‌های هم‌زمان به عنوان مبنا ذخیره نمی‌شود
+                self.record_hardsub_speed(
+                    'single', video_file, time.monotonic() - started, contended=threads is not None
+                )
+                self.log(f"✅ زیرنویس با موفقیت چسبانده شد: {os.path.basename(output_file)}")
                 return output_file
             else:
                 raise Exception("FFmpeg با کد خطا بسته شد. لاگ را بررسی کنید.")
@@ -868,6 +2340,339 @@ class PersianSubtitleApp:
         except Exception as e:
             raise Exception(f"خطا در چسباندن زیرنویس: {str(e)}")
     
+    def hardcode_subtitle_parallel(self, video_file, segments, video_name, style=None, output_name="persian",
+                                   threads=None):
+        """هاردساب موازی: برش در کی‌فریم‌ها، انکود هم‌زمان بخش‌ها و اتصال بدون افت کیفیت"""
+        count = self.parallel_segments.get()
+        duration = self.probe_duration(video_file)
+        if not duration:
+            self.log("⚠️ مدت ویدیو قابل تشخیص نیست، حالت موازی غیرفعال شد")
+            return None
+        
+        ranges = self.plan_segment_ranges(duration, self.get_keyframe_times(video_file), count)
+        if len(ranges) < 2:
+            self.log("⚠️ کی‌فریم مناسب برای برش پیدا نشد، حالت موازی غیرفعال شد")
+            return None
+        
+        output_file = os.path.join(
+            self.output_dir.get(),
+            f"{video_name}_with_{output_name}_subtitle.mp4"
+        )
+        work_dir = tempfile.mkdtemp(prefix=f"{video_name}_{output_name}_parts_", dir=self.output_dir.get())
+        
+        try:
+            # ساخت زیرنویس جابه‌جا شده برای هر بخش
+            jobs = []
+            for i, (range_start, range_end) in enumerate(ranges):
+                part_subtitle = self.create_subtitle_file(
+                    self.slice_segments(segments, range_start, range_end),
+                    video_name,
+                    subtitle_file=os.path.join(work_dir, f"part_{i:03d}.ass"),
+                    extra_formats=(),
+                    style=style
+                )
+                jobs.append((i, range_start, range_end, part_subtitle))
+            
+            # مبنای مقایسه پیش از شروع انکود موازی؛ در خروجی‌های هم‌زمان (threads) سنجش
+            # زیر بار انجام می‌شد، پس فقط مقدار ذخیره شده استفاده می‌شود
+            baseline = self.single_hardsub_speed(
+                video_file, jobs[0][3], work_dir, duration, measure=threads is None
+            )
+            
+            # سهم این خروجی از CPU (در خروجی‌های هم‌زمان) بین بخش‌ها تقسیم می‌شود
+            threads = max(1, (threads or os.cpu_count() or 1) // len(jobs))
+            self.log(f"⏳ انکود هم‌زمان {len(jobs)} بخش ({threads} ترد برای هر FFmpeg)...")
+            
+            started = time.monotonic()
+            cancel = threading.Event()
+            with ThreadPoolExecutor(max_workers=len(jobs)) as executor:
+                futures = [
+                    executor.submit(self.encode_segment_range, video_file, work_dir, threads, cancel, *job)
+                    for job in jobs
+                ]
+            parts = [future.result() for future in futures]
+            
+            if not self.processing or None in parts:
+                raise Exception("پردازش متوقف شد")
+            
+            # اتصال بخش‌ها با concat demuxer و افزودن صدای اصلی بدون انکود مجدد
+            list_file = os.path.join(work_dir, "parts.txt")
+            with open(list_file, 'w', encoding='utf-8') as f:
+                for part in parts:
+                    escaped = part.replace('\\', '/').replace("'", "'\\''")
+                    f.write(f"file '{escaped}'\n")
+            
+            cmd = [
+                'ffmpeg',
+                '-f', 'concat',
+                '-safe', '0',
+                '-i', list_file,
+                '-i', video_file,
+                '-map', '0:v:0',
+                '-map', '1:a?',
+                '-c', 'copy',
+                '-y',
+                output_file
+            ]
+            result = subprocess.run(
+                cmd,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                universal_newlines=True,
+                encoding='utf-8',
+                startupinfo=self.get_startupinfo()
+            )
+            if result.returncode != 0:
+                raise Exception("اتصال بخش‌ها با FFmpeg ناموفق بود")
+            
+            elapsed = time.monotonic() - started
+            self.verify_segment_seams(ranges, parts, output_file, duration)
+            self.record_hardsub_speed('parallel', video_file, elapsed, duration, baseline=baseline)
+            self.log("✅ زیرنویس با موفقیت چسبانده شد (حالت موازی)")
+            return output_file
+        
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+    
+    def encode_segment_range(self, video_file, work_dir, threads, cancel, index, range_start, range_end, subtitle_file):
+        """انکود یک بازه زمانی از ویدیو با زیرنویس مخصوص همان بازه (بدون صدا)
+        
+        با اولین خطا رویداد cancel تنظیم می‌شود تا FFmpeg بخش‌های دیگر هم متوقف شوند؛
+        بخش لغو شده None برمی‌گرداند.
+        """
+        part_file = os.path.join(work_dir, f"part_{index:03d}.mp4")
+        
+        cmd = ['ffmpeg', '-ss', f"{range_start:.6f}", '-i', video_file]
+        if range_end is not None:
+            cmd += ['-t', f"{range_end - range_start:.6f}"]
+        cmd += [
+            '-map', '0:v:0',
+            '-an',
+            '-vf', f"ass='{self.ffmpeg_subtitle_path(subtitle_file)}'",
+            '-threads', str(threads),
+            '-y',
+            part_file
+        ]
+        
+        try:
+            with open(os.path.join(work_dir, f"part_{index:03d}.log"), 'w', encoding='utf-8') as log_file:
+                process = subprocess.Popen(
+                    cmd,
+                    stdout=subprocess.DEVNULL,
+                    stderr=log_file,
+                    startupinfo=self.get_startupinfo()
+                )
+                # توقف FFmpeg در صورت درخواست کاربر یا خطای بخش دیگر
+                while process.poll() is None:
+                    if not self.processing or cancel.is_set():
+                        process.terminate()
+                        process.wait()
+                        return None
+                    time.sleep(0.2)
+            
+            if process.returncode != 0 and self.processing:
+                raise Exception(f"انکود بخش {index + 1} ناموفق بود")
+        except Exception:
+            cancel.set()
+            raise
+        return part_file
+    
+    def plan_segment_ranges(self, duration, keyframes, count):
+        """انتخاب نقاط برش روی نزدیک‌ترین کی‌فریم به تقسیم مساوی مدت ویدیو"""
+        min_length = 10.0  # بخش‌های خیلی کوتاه ارزش پردازش جداگانه ندارند
+        cuts = []
+        for i in range(1, count):
+            target = duration * i / count
+            candidates = [k for k in keyframes if k > (cuts[-1] if cuts else 0.0) + min_length]
+            if not candidates:
+                break
+            cut = min(candidates, key=lambda k: abs(k - target))
+            if duration - cut < min_length:
+                break
+            cuts.append(cut)
+        
+        bounds = [0.0] + cuts
+        # بازه آخر تا انتهای فایل ادامه می‌یابد (None)
+        return [(bounds[i], bounds[i + 1] if i + 1 < len(bounds) else None) for i in range(len(bounds))]
+    
+    def slice_segments(self, segments, range_start, range_end):
+        """برش بخش‌های زیرنویس برای یک بازه و انتقال زمان آن‌ها به ابتدای بازه"""
+        sliced = []
+        for segment in segments:
+            if segment.end <= range_start or (range_end is not None and segment.start >= range_end):
+                continue
+            end = segment.end if range_end is None else min(segment.end, range_end)
+            sliced.append(SubtitleSegment(
+                start=max(segment.start, range_start) - range_start,
+                end=end - range_start,
+                text=segment.text
+            ))
+        return SegmentStore.from_segments(sliced)
+    
+    def verify_segment_seams(self, ranges, parts, output_file, duration):
+        """بررسی هم‌زمانی صدا و تصویر در محل اتصال بخش‌ها"""
+        frame_time = 1.0 / (self.probe_frame_rate(output_file) or 25.0)
+        drift = 0.0
+        for i, ((range_start, range_end), part) in enumerate(zip(ranges, parts)):
+            expected = (range_end if range_end is not None else duration) - range_start
+            actual = self.probe_duration(part, stream='v:0') or expected
+            drift += actual - expected
+            if abs(drift) > frame_time:
+                self.log(f"⚠️ انحراف هم‌زمانی در اتصال {i + 1}: {drift * 1000:.0f}ms")
+        
+        video_duration = self.probe_duration(output_file, stream='v:0')
+        audio_duration = self.probe_duration(output_file, stream='a:0')
+        if video_duration and audio_duration:
+            gap = video_duration - audio_duration
+            self.log(f"🔍 اختلاف طول صدا و تصویر: {gap * 1000:.0f}ms")
+            if abs(gap) > 2 * frame_time:
+                self.log("⚠️ احتمال ناهمگامی صدا و تصویر وجود دارد")
+        else:
+            self.log(f"🔍 انحراف تجمعی اتصال‌ها: {drift * 1000:.0f}ms")
+    
+    def record_hardsub_speed(self, mode, video_file, elapsed, duration=None, baseline=None, contended=False):
+        """ثبت ضریب بلادرنگ هاردساب و گزارش افزایش سرعت نسبت به حالت تک‌پردازشی"""
+        duration = duration or self.probe_duration(video_file)
+        if not duration or elapsed <= 0:
+            return
+        
+        speed = duration / elapsed
+        self.hardsub_speed[mode] = speed
+        METRICS.observe("ffmpeg_realtime_factor", speed, mode=mode)
+        self.log(f"⏱️ زمان هاردساب: {elapsed:.1f}s (سرعت {speed:.2f}x بلادرنگ)")
+        
+        if mode == 'single' and not contended:
+            self.update_speed_profile(self.hardsub_profile_key(video_file), speed)
+        elif mode == 'parallel' and baseline:
+            self.log(f"🚀 افزایش سرعت نسبت به حالت تک‌پردازشی: {speed / baseline:.2f}x (مبنا {baseline:.2f}x بلادرنگ)")
+        elif mode == 'parallel':
+            self.log("ℹ️ مبنای حالت تک‌پردازشی هنوز سنجیده نشده (در خروجی‌های هم‌زمان سنجیده نمی‌شود)")
+    
+    def hardsub_profile_key(self, video_file):
+        """کلید سرعت هاردساب تک‌پردازشی در پروفایل سیستم (به تفکیک ارتفاع تصویر)"""
+        height = self.probe_value(video_file, 'stream=height', stream='v:0')
+        return f"hardsub|single|{int(height or 0)}p"
+    
+    def single_hardsub_speed(self, video_file, subtitle_file, work_dir, duration, measure=True, sample_seconds=20.0):
+        """ضریب بلادرنگ حالت تک‌پردازشی روی این سیستم (ذخیره شده یا با انکود یک نمونه کوتاه)"""
+        key = self.hardsub_profile_key(video_file)
+        with self._baseline_lock:
+            speed = self.load_speed_profile().get(key)
+            if speed or not measure:
+                return speed
+            return self.measure_single_hardsub_speed(key, video_file, subtitle_file, work_dir, duration, sample_seconds)
+    
+    def measure_single_hardsub_speed(self, key, video_file, subtitle_file, work_dir, duration, sample_seconds):
+        """انکود تک‌پردازشی یک نمونه کوتاه و ذخیره ضریب بلادرنگ آن در پروفایل سیستم"""
+        sample_seconds = min(sample_seconds, duration)
+        self.log(f"⏱️ سنجش سرعت حالت تک‌پردازشی روی {sample_seconds:.0f} ثانیه از ویدیو...")
+        cmd = [
+            'ffmpeg',
+            '-t', f"{sample_seconds:.3f}",
+            '-i', video_file,
+            '-map', '0:v:0',
+            '-an',
+            '-vf', f"ass='{self.ffmpeg_subtitle_path(subtitle_file)}'",
+            '-y',
+            os.path.join(work_dir, "baseline.mp4")
+        ]
+        started = time.monotonic()
+        result = subprocess.run(
+            cmd,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            startupinfo=self.get_startupinfo()
+        )
+        elapsed = time.monotonic() - started
+        if result.returncode != 0 or elapsed <= 0:
+            return None
+        
+        speed = sample_seconds / elapsed
+        self.update_speed_profile(key, speed)
+        return speed
+    
+    def probe_duration(self, media_file, stream=None):
+        """دریافت مدت فایل یا یک استریم با ffprobe (ثانیه)"""
+        return self.probe_value(media_file, 'stream=duration' if stream else 'format=duration', stream)
+    
+    def probe_value(self, media_file, entry, stream=None):
+        """دریافت یک مقدار عددی (مثلاً format=start_time یا stream=height) با ffprobe"""
+        cmd = ['ffprobe', '-v', 'error']
+        if stream:
+            cmd += ['-select_streams', stream]
+        cmd += ['-show_entries', entry, '-of', 'csv=p=0', media_file]
+        try:
+            output = subprocess.run(
+                cmd,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                universal_newlines=True,
+                startupinfo=self.get_startupinfo()
+            ).stdout.strip()
+            return float(output.splitlines()[0])
+        except (ValueError, IndexError, FileNotFoundError):
+            return None
+    
+    def probe_frame_rate(self, media_file):
+        """دریافت نرخ فریم استریم تصویر"""
+        cmd = ['ffprobe', '-v', 'error', '-select_streams', 'v:0',
+               '-show_entries', 'stream=avg_frame_rate', '-of', 'csv=p=0', media_file]
+        try:
+            output = subprocess.run(
+                cmd,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                universal_newlines=True,
+                startupinfo=self.get_startupinfo()
+            ).stdout.strip()
+            num, den = output.splitlines()[0].split('/')
+            return float(num) / float(den)
+        except (ValueError, IndexError, ZeroDivisionError, FileNotFoundError):
+            return None
+    
+    def get_keyframe_times(self, video_file):
+        """استخراج زمان کی‌فریم‌ها از روی پکت‌ها (بدون دیکود)"""
+        cmd = ['ffprobe', '-v', 'error', '-select_streams', 'v:0',
+               '-show_entries', 'packet=pts_time,flags', '-of', 'csv=p=0', video_file]
+        try:
+            output = subprocess.run(
+                cmd,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                universal_newlines=True,
+                startupinfo=self.get_startupinfo()
+            ).stdout
+        except FileNotFoundError:
+            return []
+        
+        # زمان‌ها نسبت به ابتدای فایل سنجیده می‌شوند (همان مبنای -ss)
+        offset = self.probe_value(video_file, 'format=start_time') or 0.0
+        
+        keyframes = []
+        for line in output.splitlines():
+            parts = line.split(',')
+            if len(parts) >= 2 and 'K' in parts[1]:
+                try:
+                    keyframes.append(float(parts[0]) - offset)
+                except ValueError:
+                    continue
+        return sorted(keyframes)
+    
+    def ffmpeg_subtitle_path(self, subtitle_file):
+        """اصلاح مسیر زیرنویس برای فیلتر ass در FFmpeg"""
+        # در ویندوز، FFmpeg با \ مشکل دارد و : باید اسکیپ شود
+        if os.name == 'nt':
+            return subtitle_file.replace('\\', '/').replace(':', '\\:')
+        return subtitle_file
+    
+    def get_startupinfo(self):
+        """startupinfo برای مخفی کردن پنجره کنسول FFmpeg در ویندوز"""
+        if os.name != 'nt':
+            return None
+        startupinfo = subprocess.STARTUPINFO()
+        startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
+        return startupinfo
+    
     def hex_to_rgb(self, hex_color):
         """تبدیل رنگ HEX به RGB"""
         hex_color = hex_color.lstrip('#')
@@ -876,6 +2681,8 @@ class PersianSubtitleApp:
 
 def main():
     """تابع اصلی"""
+    if METRICS_PORT:
+        METRICS.serve(int(METRICS_PORT))
     root = tk.Tk()
     app = PersianSubtitleApp(root)
     root.mainloop()
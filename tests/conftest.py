@@ -0,0 +1,5 @@
+import os
+import sys
+
+# ماژول برنامه در ریشه مخزن است (بدون بسته نصبی)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
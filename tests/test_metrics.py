@@ -0,0 +1,97 @@
+"""خروجی متنی Prometheus از MetricsRegistry"""
+import urllib.error
+import urllib.request
+
+import pytest
+
+pytest.importorskip("tkinter")
+pytest.importorskip("arabic_reshaper")
+pytest.importorskip("bidi")
+
+from persian_subtitle_app import MetricsRegistry
+
+PREFIX = MetricsRegistry.PREFIX
+
+
+@pytest.fixture
+def registry():
+    return MetricsRegistry()
+
+
+def sample_lines(text, name):
+    return [line for line in text.splitlines() if line.startswith(PREFIX + name)]
+
+
+def test_counter_and_gauge(registry):
+    registry.describe("files_total", "counter", "Files")
+    registry.inc("files_total", status="success")
+    registry.inc("files_total", 2, status="success")
+    registry.inc("files_total", status="failed")
+    registry.set_gauge("queue", 3)
+    
+    text = registry.render()
+    
+    assert f"# HELP {PREFIX}files_total Files" in text
+    assert f"# TYPE {PREFIX}files_total counter" in text
+    assert sample_lines(text, "files_total") == [
+        f'{PREFIX}files_total{{status="failed"}} 1',
+        f'{PREFIX}files_total{{status="success"}} 3',
+    ]
+    assert sample_lines(text, "queue") == [f"{PREFIX}queue 3"]
+    assert text.endswith("\n")
+
+
+def test_histogram_buckets_are_cumulative(registry):
+    registry.describe("rtf", "histogram", "Speed", buckets=(1, 2, 4))
+    for value in (0.5, 1, 1.5, 3, 10):
+        registry.observe("rtf", value, mode="parallel")
+    
+    assert sample_lines(registry.render(), "rtf") == [
+        f'{PREFIX}rtf_bucket{{mode="parallel",le="1"}} 2',
+        f'{PREFIX}rtf_bucket{{mode="parallel",le="2"}} 3',
+        f'{PREFIX}rtf_bucket{{mode="parallel",le="4"}} 4',
+        f'{PREFIX}rtf_bucket{{mode="parallel",le="+Inf"}} 5',
+        f'{PREFIX}rtf_sum{{mode="parallel"}} 16.0',
+        f'{PREFIX}rtf_count{{mode="parallel"}} 5',
+    ]
+
+
+def test_labels_are_sorted_and_escaped(registry):
+    registry.inc("failures_total", stage='hard"sub', reason="path\\to\nfile")
+    
+    assert sample_lines(registry.render(), "failures_total") == [
+        f'{PREFIX}failures_total{{reason="path\\\\to\\nfile",stage="hard\\"sub"}} 1',
+    ]
+
+
+def test_undescribed_metric_gets_type(registry):
+    registry.observe("latency", 0.7)
+    text = registry.render()
+    
+    assert f"# TYPE {PREFIX}latency histogram" in text
+    assert f"{PREFIX}latency_count 1" in text
+
+
+def test_write_textfile(registry, tmp_path):
+    registry.inc("files_total")
+    path = tmp_path / "metrics.prom"
+    
+    registry.write_textfile(str(path))
+    
+    assert path.read_text(encoding="utf-8") == registry.render()
+    assert not (tmp_path / "metrics.prom.tmp").exists()
+
+
+def test_http_endpoint(registry):
+    registry.inc("files_total")
+    server = registry.serve(0)
+    try:
+        url = f"http://127.0.0.1:{server.server_address[1]}"
+        with urllib.request.urlopen(f"{url}/metrics") as response:
+            assert response.headers["Content-Type"].startswith("text/plain; version=0.0.4")
+            assert response.read().decode("utf-8") == registry.render()
+        with pytest.raises(urllib.error.HTTPError):
+            urllib.request.urlopen(f"{url}/other")
+    finally:
+        server.shutdown()
+        server.server_close()
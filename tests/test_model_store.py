@@ -0,0 +1,104 @@
+"""مخزن محلی مدل‌ها: اعتبارسنجی نام‌ها و وارد کردن امن با checksum"""
+import json
+
+import pytest
+
+pytest.importorskip("tkinter")
+pytest.importorskip("arabic_reshaper")
+pytest.importorskip("bidi")
+
+from persian_subtitle_app import ModelStore
+
+
+def make_model(directory, content):
+    directory.mkdir(parents=True)
+    (directory / "model.bin").write_text(content)
+    (directory / "config.json").write_text("{}")
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = ModelStore(tmp_path / "store")
+    make_model(store.model_dir("whisper-tiny"), "verified")
+    store.register("whisper-tiny")
+    return store
+
+
+@pytest.fixture
+def source(tmp_path):
+    return tmp_path / "usb"
+
+
+def write_manifest(source, manifest):
+    source.mkdir(parents=True, exist_ok=True)
+    (source / ModelStore.MANIFEST).write_text(json.dumps(manifest))
+
+
+@pytest.mark.parametrize("name", ["whisper-medium", "nllb-200-distilled-600M", "model_v2.1"])
+def test_valid_names(name):
+    assert ModelStore.is_valid_name(name)
+
+
+@pytest.mark.parametrize("name", [
+    "", ".", "..", "../..", "../victim", "a/b", "a\\b", "C:evil", ".hidden", "/etc", None, 42
+])
+def test_invalid_names(name):
+    assert not ModelStore.is_valid_name(name)
+
+
+def test_import_verified_model(store, source):
+    make_model(source / "whisper-base", "base")
+    write_manifest(source, {"whisper-base": ModelStore.checksum_dir(source / "whisper-base")})
+    
+    imported, failed = store.import_store(source)
+    
+    assert (imported, failed) == (["whisper-base"], [])
+    assert store.has("whisper-base") and store.verify("whisper-base")
+
+
+def test_import_rejects_path_traversal(tmp_path, store, source):
+    victim = tmp_path / "victim"
+    make_model(victim, "keep me")
+    write_manifest(source, {"../victim": {}, "..": {}, "../..": {}})
+    
+    imported, failed = store.import_store(source)
+    
+    assert imported == []
+    assert sorted(failed) == sorted(["../victim", "..", "../.."])
+    assert (victim / "model.bin").read_text() == "keep me"
+    assert sorted(p.name for p in store.root.iterdir()) == [ModelStore.MANIFEST, "whisper-tiny"]
+
+
+def test_failed_import_keeps_verified_model(store, source):
+    make_model(source / "whisper-tiny", "tampered")
+    write_manifest(source, {"whisper-tiny": {"model.bin": "0" * 64, "config.json": "0" * 64}})
+    
+    imported, failed = store.import_store(source)
+    
+    assert (imported, failed) == ([], ["whisper-tiny"])
+    assert (store.model_dir("whisper-tiny") / "model.bin").read_text() == "verified"
+    assert store.verify("whisper-tiny")
+    # پوشه‌های موقت وارد کردن باقی نمی‌مانند
+    assert sorted(p.name for p in store.root.iterdir()) == [ModelStore.MANIFEST, "whisper-tiny"]
+
+
+def test_import_replaces_model_after_checksum(store, source):
+    make_model(source / "whisper-tiny", "updated")
+    write_manifest(source, {"whisper-tiny": ModelStore.checksum_dir(source / "whisper-tiny")})
+    
+    assert store.import_store(source) == (["whisper-tiny"], [])
+    assert (store.model_dir("whisper-tiny") / "model.bin").read_text() == "updated"
+    assert store.verify("whisper-tiny")
+
+
+def test_verify_detects_modified_file(store):
+    (store.model_dir("whisper-tiny") / "model.bin").write_text("corrupted")
+    
+    assert not store.verify("whisper-tiny")
+
+
+def test_import_without_manifest_fails(store, source):
+    source.mkdir()
+    
+    with pytest.raises(Exception):
+        store.import_store(source)
@@ -0,0 +1,77 @@
+"""رفت و برگشت قالب ستونی SegmentStore (bytes / فایل memory-mapped)"""
+import pytest
+
+pytest.importorskip("tkinter")
+pytest.importorskip("arabic_reshaper")
+pytest.importorskip("bidi")
+
+from persian_subtitle_app import SegmentStore, SubtitleSegment
+
+SEGMENTS = [
+    SubtitleSegment(0.0, 1.5, "سلام دنیا"),
+    SubtitleSegment(1.5, 3.25, ""),
+    SubtitleSegment(3.25, 7.0, r"line one\Nline two"),
+    SubtitleSegment(3600.125, 3601.0, "emoji 🎬 and English"),
+]
+
+
+@pytest.mark.parametrize("segments", [SEGMENTS, []], ids=["segments", "empty"])
+def test_bytes_round_trip(segments):
+    store = SegmentStore.from_segments(segments)
+    restored = SegmentStore.from_bytes(store.to_bytes())
+    
+    assert len(restored) == len(segments)
+    assert list(restored) == segments
+
+
+@pytest.mark.parametrize("segments", [SEGMENTS, []], ids=["segments", "empty"])
+def test_save_load_mmap(tmp_path, segments):
+    path = SegmentStore.from_segments(segments).save(str(tmp_path / "segments.pseg"))
+    
+    store = SegmentStore.load(path)
+    try:
+        assert list(store) == segments
+        if segments:
+            assert store[-1] == segments[-1]
+            assert store.text(0) == segments[0].text
+    finally:
+        store.close()
+    
+    # پس از close فایل آزاد است و می‌توان آن را حذف کرد (مهم در ویندوز)
+    (tmp_path / "segments.pseg").unlink()
+
+
+def test_with_texts_shares_times(tmp_path):
+    store = SegmentStore.load(SegmentStore.from_segments(SEGMENTS).save(str(tmp_path / "segments.pseg")))
+    try:
+        translated = store.with_texts([f"t{i}" for i in range(len(SEGMENTS))])
+        
+        assert [segment.text for segment in translated] == ["t0", "t1", "t2", "t3"]
+        assert [(s.start, s.end) for s in translated] == [(s.start, s.end) for s in SEGMENTS]
+        # متن اصلی دست نخورده می‌ماند
+        assert list(store) == SEGMENTS
+        
+        with pytest.raises(ValueError):
+            store.with_texts(["too few"])
+    finally:
+        store.close()
+
+
+def test_close_releases_views(tmp_path):
+    store = SegmentStore.load(SegmentStore.from_segments(SEGMENTS).save(str(tmp_path / "segments.pseg")))
+    store.close()
+    store.close()  # فراخوانی دوباره بی‌اثر است
+    
+    assert store.starts is None and store.pool is None
+
+
+def test_shifted_clamps_at_zero():
+    store = SegmentStore.from_segments(SEGMENTS).shifted(-1.0)
+    
+    assert [(s.start, s.end) for s in store][:2] == [(0.0, 0.5), (0.5, 2.25)]
+    assert [s.text for s in store] == [s.text for s in SEGMENTS]
+
+
+def test_rejects_invalid_data():
+    with pytest.raises(ValueError):
+        SegmentStore.from_bytes(b"NOTPSEG0" + bytes(16))
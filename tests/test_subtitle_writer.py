@@ -0,0 +1,102 @@
+"""مقایسه بایت به بایت نویسنده جریانی ASS/SRT/WebVTT با خروجی pysubs2"""
+import pytest
+
+pysubs2 = pytest.importorskip("pysubs2")
+pytest.importorskip("tkinter")
+pytest.importorskip("arabic_reshaper")
+pytest.importorskip("bidi")
+
+from pysubs2.formats.subrip import SubripFormat
+from pysubs2.formats.substation import SubstationFormat
+
+from persian_subtitle_app import (
+    PersianSubtitleApp, SegmentStore, SubtitleSegment, format_ass_timestamps, format_srt_timestamps
+)
+
+STYLE = {
+    'font_name': "Vazirmatn",
+    'font_size': 18,
+    'font_color': "#FFFFFF",
+    'outline_color': "#000000",
+    'outline_width': 2,
+    'position': "bottom"
+}
+
+# زمان‌ها به میلی‌ثانیه: مرزهای گرد کردن سانتی‌ثانیه در ASS (کمتر از 10 ساعت؛ pysubs2 بالاتر از آن را محدود می‌کند)
+EDGE_TIMES = [0, 4, 5, 994, 995, 999, 1000, 1004, 1005, 59995, 3599994, 3599995, 35999984]
+
+CASES = {
+    # نیم میلی‌ثانیه اضافه تا int(ثانیه * 1000) دقیقاً همان میلی‌ثانیه مرزی شود
+    'rounding': [SubtitleSegment((ms + 0.5) / 1000, (ms + 5.5) / 1000, f"edge {ms}") for ms in EDGE_TIMES],
+    'override_tags': [
+        SubtitleSegment(1.0, 2.5, r"{\i1}italic{\i0} text"),
+        SubtitleSegment(3.0, 4.0, r"{\an8}top {\b1}bold{\b0}"),
+    ],
+    'line_breaks': [
+        SubtitleSegment(0.5, 1.5, r"first line\Nsecond line"),
+        SubtitleSegment(2.0, 3.0, r"  padded\N\Nempty middle  "),
+        SubtitleSegment(3.5, 4.5, r"hard\hspace\nsoft"),
+    ],
+    'persian': [
+        SubtitleSegment(0.0, 2.0, "سلام دنیا"),
+        SubtitleSegment(2.0, 4.25, "این یک زیرنویس فارسی است، با عدد 123 و English"),
+        SubtitleSegment(4.25, 6.0, r"خط اول\Nخط دوم"),
+    ],
+}
+
+
+@pytest.fixture
+def app():
+    instance = PersianSubtitleApp.__new__(PersianSubtitleApp)
+    instance.log = lambda message: None
+    return instance
+
+
+def reference_files(app, segments, header, tmp_path):
+    """خروجی pysubs2: ASS با متن بازآرایی شده و SRT/WebVTT با متن منطقی"""
+    ass = pysubs2.SSAFile.from_string(header)
+    plain = pysubs2.SSAFile()
+    for segment in segments:
+        start, end = int(segment.start * 1000), int(segment.end * 1000)
+        ass.append(pysubs2.SSAEvent(start=start, end=end, text=app.fix_text_direction(segment.text)))
+        plain.append(pysubs2.SSAEvent(start=start, end=end, text=segment.text))
+    
+    ass.save(str(tmp_path / "expected.ass"))
+    plain.save(str(tmp_path / "expected.srt"))
+    plain.save(str(tmp_path / "expected.vtt"))
+    return {fmt: (tmp_path / f"expected.{fmt}").read_bytes() for fmt in ('ass', 'srt', 'vtt')}
+
+
+def test_timestamps_match_pysubs2():
+    values = EDGE_TIMES + list(range(0, 2000)) + list(range(3598000, 3602000, 7))
+    
+    assert format_ass_timestamps(values) == [SubstationFormat.ms_to_timestamp(ms) for ms in values]
+    assert format_srt_timestamps(values) == [SubripFormat.ms_to_timestamp(ms) for ms in values]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 1024])
+@pytest.mark.parametrize("case", sorted(CASES))
+def test_writer_matches_pysubs2(app, tmp_path, case, chunk_size):
+    segments = SegmentStore.from_segments(CASES[case])
+    header = app.build_ass_header(STYLE)
+    
+    app.write_subtitle_files(
+        segments,
+        header,
+        str(tmp_path / "actual.ass"),
+        {fmt: str(tmp_path / f"actual.{fmt}") for fmt in ('srt', 'vtt')},
+        chunk_size=chunk_size
+    )
+    
+    expected = reference_files(app, segments, header, tmp_path)
+    for fmt in ('ass', 'srt', 'vtt'):
+        assert (tmp_path / f"actual.{fmt}").read_bytes() == expected[fmt], fmt
+
+
+def test_header_matches_pysubs2_style(app):
+    header = app.build_ass_header(dict(STYLE, position="top", font_color="#FFD500"))
+    style = pysubs2.SSAFile.from_string(header).styles["Default"]
+    
+    assert style.alignment == 8
+    assert (style.primarycolor.r, style.primarycolor.g, style.primarycolor.b) == (0xFF, 0xD5, 0x00)
+    assert style.bold